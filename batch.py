@@ -0,0 +1,129 @@
+import logging
+import re
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from crawler import StockCrawler
+from report import write_stock_output, write_batch_summary, summary_record
+from instrumentation import metrics
+from utils import is_empty_frame
+
+logger = logging.getLogger(__name__)
+
+def load_watchlist(path):
+    """
+    Read stock codes from a watchlist file, one or more per line separated by
+    commas or whitespace. Text after '#' is treated as a comment.
+    """
+    stock_codes = []
+    # utf-8-sig drops the BOM Windows Notepad writes, which would stick to the first code
+    with open(path, encoding="utf-8-sig") as f:
+        for line in f:
+            line = line.split("#", 1)[0]
+            stock_codes.extend(code for code in re.split(r"[,\s]+", line) if code)
+    # Drop duplicates but keep the watchlist order
+    return list(dict.fromkeys(stock_codes))
+
+def run_batch(stock_codes, pool, max_workers=5, output_dir="output", backend=None, base_url=None,
+              cache=None, refresh=False, engine=None, store=None, fmt="xlsx", runner=None, checkpoint=None,
+              parser=None, bulk=None):
+    """
+    Crawl every dataset of every stock through one shared executor (or the
+    given AsyncCrawlEngine) and write per-stock outputs in the given format
+    plus a combined summary. A failed stock is reported in the summary instead of aborting
+    the run. Fetched rows are appended to the HistoryStore if one is given.
+    With a JobRunner, failed fetches are retried with backoff behind its circuit
+    breaker. With a Checkpoint, finished work is logged as it completes and
+    skipped when the run is started again. With a ParsePool, pages are parsed
+    in worker processes while the fetch threads carry on. With BulkQuotes,
+    price and share come from one market-wide download instead of two pages per stock.
+    Return the summary records.
+    """
+    strict = runner is not None
+    crawlers = {code: StockCrawler(code, pool=pool, backend=backend, base_url=base_url, cache=cache, refresh=refresh,
+                                   strict=strict, parser=parser, bulk=bulk) for code in stock_codes}
+    results = {code: {} for code in stock_codes}
+    errors = {code: {} for code in stock_codes}
+    pending = {code: len(StockCrawler.DATASETS) for code in stock_codes}
+    records = {}
+    if checkpoint is not None:
+        # Resume: finished stocks keep their record, finished datasets their rows
+        for code in stock_codes:
+            if code in checkpoint.records:
+                records[code] = checkpoint.records[code]
+                pending[code] = 0
+            elif code in checkpoint.datasets:
+                results[code].update(checkpoint.datasets[code])
+                pending[code] -= len(checkpoint.datasets[code])
+
+    def finish(code):
+        data = results[code]
+        if all(is_empty_frame(data.get(dataset)) for dataset in StockCrawler.DATASETS):
+            record = {"Stock Code": code, "Status": "failed"}
+            logger.error("Stock %s failed: no data could be fetched", code)
+        else:
+            try:
+                _, summary = write_stock_output(code, data, output_dir=output_dir, fmt=fmt)
+                status = "partial" if errors[code] or any(is_empty_frame(df) for df in data.values()) else "ok"
+                record = {"Stock Code": code, "Status": status, **summary_record(summary)}
+            except Exception as e:
+                record = {"Stock Code": code, "Status": "failed"}
+                errors[code]["workbook"] = e
+                logger.error("Error writing output for stock %s: %s", code, e)
+        record["Errors"] = "; ".join(f"{dataset}: {e}" for dataset, e in errors[code].items())
+        records[code] = record
+        metrics.increment('stocks', status=record["Status"])
+        if checkpoint is not None and record["Status"] == "ok":
+            checkpoint.stock_done(code, record)
+
+    def collect(code, dataset, result, error):
+        if error is not None:
+            errors[code][dataset] = error
+            logger.error("Error fetching %s for stock %s: %s", dataset, code, error)
+        else:
+            results[code][dataset] = result
+            if checkpoint is not None and not is_empty_frame(result):
+                checkpoint.dataset_done(code, dataset, result)
+            if store is not None and not is_empty_frame(result):
+                added = store.append(code, dataset, result)
+                # Log when the data was downloaded, which for a cache hit is before this run
+                fetched_at = crawlers[code].fetched_at.get(dataset)
+                if fetched_at is not None:
+                    store.record_fetch(code, dataset, fetched_at)
+                metrics.increment('rows_stored', added, dataset=dataset)
+                logger.info("Stored %d new %s rows for stock %s", added, dataset, code)
+        pending[code] -= 1
+        if pending[code] == 0:
+            finish(code)
+            del results[code]  # Release the raw data once the workbook is written
+
+    jobs = [(crawlers[code], dataset) for code in stock_codes for dataset in StockCrawler.DATASETS
+            if code not in records and dataset not in results[code]]
+    for code in stock_codes:
+        if code not in records and pending[code] == 0:
+            finish(code)  # Every dataset was in the checkpoint
+    if engine is not None:
+        engine.run_sync(jobs, on_result=collect, fetch=runner.run if runner is not None else None)
+    else:
+        fetch = runner.run if runner is not None else StockCrawler.fetch
+        # Schedule all (stock, dataset) jobs so the concurrency limit applies to the whole run
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {executor.submit(fetch, crawler, dataset): (crawler.raw_stock_code, dataset) for crawler, dataset in jobs}
+            for future in as_completed(futures):
+                code, dataset = futures[future]
+                try:
+                    result, error = future.result(), None
+                except Exception as e:
+                    result, error = None, e
+                collect(code, dataset, result, error)
+
+    ordered = [records[code] for code in stock_codes]
+    if len(stock_codes) > 1:
+        write_batch_summary(ordered, output_dir=output_dir, fmt=fmt)
+    failed = [record["Stock Code"] for record in ordered if record["Status"] == "failed"]
+    if failed:
+        logger.error("Failed stocks: %s", ', '.join(failed))
+    if checkpoint is not None:
+        if all(record["Status"] == "ok" for record in ordered):
+            checkpoint.remove()
+        else:
+            logger.warning("Checkpoint kept at %s, run again to retry the unfinished datasets", checkpoint.path)
+    return ordered
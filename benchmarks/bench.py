@@ -0,0 +1,269 @@
+"""
+Offline benchmark of the single-stock and batch paths.
+
+Every scenario runs in its own process against FakeDriver (and, with
+--backend http, a local server) serving the fixture pages, and reports wall
+time, time per stage and peak RSS. Results are compared with
+benchmarks/baseline.json so regressions show up as numbers. Timings and
+memory only compare on the same machine and settings, so each baseline
+records its environment and a mismatch only prints the numbers.
+
+Usage:
+    python -m benchmarks.bench                    # run and compare with the baseline
+    python -m benchmarks.bench --update-baseline  # run and record a new baseline
+"""
+from functools import partial
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from importlib import metadata
+from urllib.parse import urlsplit
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+BASELINE_FILE = os.path.join(BENCH_DIR, "baseline.json")
+RESULT_PREFIX = "BENCH_RESULT "
+
+SCENARIOS = {
+    "single": 1,
+    "batch": 20,
+}
+
+# Packages whose versions change the numbers, recorded with every result
+ENV_PACKAGES = ("pandas", "numpy", "lxml", "openpyxl", "pyarrow", "selenium", "requests")
+
+def _stage_totals(snapshot):
+    """
+    Sum the timers of a metrics snapshot by name, across their labels
+    """
+    stages = {}
+    for timer in snapshot["timers"]:
+        stage = stages.setdefault(timer["name"], {"seconds": 0.0, "calls": 0})
+        stage["seconds"] += timer["total_seconds"]
+        stage["calls"] += timer["count"]
+    return {name: {"seconds": round(stage["seconds"], 4), "calls": stage["calls"]} for name, stage in stages.items()}
+
+def _peak_rss_mb():
+    try:
+        import resource
+    except ImportError:  # Not available on Windows
+        return None
+    # ru_maxrss is in KB on Linux and bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+def _serve_fixtures(pages, latency):
+    """
+    Serve the fixture pages over HTTP on a free local port, return the server
+    """
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            page = urlsplit(self.path).path.rsplit("/", 1)[-1].rsplit(".", 1)[0]
+            if page not in pages:
+                self.send_error(404)
+                return
+            time.sleep(latency)
+            body = pages[page].encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/html; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def _environment():
+    """
+    What the numbers depend on besides the code: interpreter, platform and package versions
+    """
+    environment = {
+        "python": platform.python_version(),
+        "system": platform.system(),
+        "machine": platform.machine(),
+        "cpus": os.cpu_count(),
+    }
+    for package in ENV_PACKAGES:
+        try:
+            environment[package] = metadata.version(package)
+        except metadata.PackageNotFoundError:
+            environment[package] = None
+    return environment
+
+def _settings(args):
+    return {name: getattr(args, name) for name in
+            ("latency", "startup", "ad", "pool_size", "workers", "parse_workers", "backend", "bulk", "format")}
+
+def run_scenario(args):
+    """
+    Run one scenario in this process and print its result as JSON
+    """
+    sys.path.insert(0, REPO_DIR)
+    import batch
+    from benchmarks import fixtures
+    from benchmarks.fake_driver import FakeDriver
+    from driver_pool import DriverPool
+    from fetcher import HttpBackend
+    from instrumentation import metrics
+    from parse_pool import ParsePool
+    from bulk import BulkQuotes
+
+    pages = fixtures.load(args.fixtures)
+    # The crawl modules time their own stages once metrics are enabled
+    metrics.enabled = True
+    factory = partial(FakeDriver, pages, latency=args.latency, startup=args.startup, ad=args.ad)
+
+    stock_codes = [str(2330 + i) for i in range(SCENARIOS[args.scenario])]
+    pool = DriverPool(size=args.pool_size, factory=factory)
+    server = backend = None
+    base_url = "https://goodinfo.tw/tw"
+    if args.backend == "http":
+        server = _serve_fixtures(pages, args.latency)
+        base_url = f"http://127.0.0.1:{server.server_address[1]}/tw"
+        backend = HttpBackend(pool_size=args.workers)
+    parser = ParsePool(args.parse_workers) if args.parse_workers else None
+    bulk = None
+    if args.bulk:
+        bulk = BulkQuotes(quotes=os.path.join(args.fixtures, fixtures.BULK_FILES["quotes"]),
+                          listing=os.path.join(args.fixtures, fixtures.BULK_FILES["listing"]))
+    with tempfile.TemporaryDirectory() as output_dir:
+        start = time.perf_counter()
+        try:
+            records = batch.run_batch(stock_codes, pool, max_workers=args.workers, output_dir=output_dir,
+                                      backend=backend, base_url=base_url, fmt=args.format, parser=parser, bulk=bulk)
+        finally:
+            pool.shutdown()
+            if parser is not None:
+                parser.close()
+            if server is not None:
+                server.shutdown()
+        wall = time.perf_counter() - start
+    result = {
+        "scenario": args.scenario,
+        "stocks": len(stock_codes),
+        "wall_seconds": round(wall, 4),
+        "stages": _stage_totals(metrics.snapshot()),
+        "peak_rss_mb": _peak_rss_mb(),
+        "failed": [record["Stock Code"] for record in records if record["Status"] != "ok"],
+        "environment": _environment(),
+        "settings": _settings(args),
+    }
+    print(RESULT_PREFIX + json.dumps(result))
+
+def _child_command(args, scenario):
+    command = [
+        sys.executable, "-m", "benchmarks.bench", "--child", scenario,
+        "--fixtures", args.fixtures, "--latency", str(args.latency), "--startup", str(args.startup),
+        "--pool-size", str(args.pool_size), "--workers", str(args.workers), "--parse-workers", str(args.parse_workers),
+        "--backend", args.backend, "--format", args.format,
+    ]
+    if args.ad:
+        command.append("--ad")
+    if args.bulk:
+        command.append("--bulk")
+    return command
+
+def _compare(result, baseline, tolerance):
+    """
+    Print the result next to the baseline, return True if it regressed beyond tolerance.
+    A baseline from another environment or with other settings is shown but never counts as a regression.
+    """
+    regressed = False
+    comparable = True
+    if baseline:
+        mismatches = []
+        for group in ("environment", "settings"):
+            recorded = baseline.get(group)
+            if recorded is None:
+                mismatches.append(f"no {group} recorded")
+            else:
+                mismatches += [f"{name} {recorded.get(name)} vs {value}"
+                               for name, value in result[group].items() if recorded.get(name) != value]
+        if mismatches:
+            comparable = False
+            print(f"  baseline not comparable ({'; '.join(mismatches)}), not checking for regressions;"
+                  f" record one for this machine and these settings with --update-baseline")
+    rows = [("wall_seconds", result["wall_seconds"], baseline.get("wall_seconds") if baseline else None)]
+    rows += [(f"stage {stage}", value["seconds"], ((baseline or {}).get("stages", {}).get(stage) or {}).get("seconds"))
+             for stage, value in sorted(result["stages"].items())]
+    rows.append(("peak_rss_mb", result["peak_rss_mb"], baseline.get("peak_rss_mb") if baseline else None))
+    for name, value, base in rows:
+        if value is None:
+            continue
+        if base:
+            change = (value - base) / base
+            flag = "  REGRESSION" if comparable and change > tolerance and name in ("wall_seconds", "peak_rss_mb") else ""
+            regressed = regressed or bool(flag)
+            print(f"  {name:<24}{value:>12.3f}  baseline {base:>10.3f}  ({change:+.1%}){flag}")
+        else:
+            print(f"  {name:<24}{value:>12.3f}")
+    if result["failed"]:
+        print(f"  stocks not fully crawled: {', '.join(result['failed'])}")
+    return regressed
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline benchmark of the crawler against fixture pages")
+    parser.add_argument("--scenario", choices=list(SCENARIOS) + ["all"], default="all")
+    parser.add_argument("--fixtures", default=os.path.join(BENCH_DIR, "fixtures"), help="Directory of fixture pages")
+    parser.add_argument("--latency", type=float, default=0.2, help="Seconds per page load")
+    parser.add_argument("--startup", type=float, default=1.0, help="Seconds to start a driver")
+    parser.add_argument("--ad", action="store_true", help="Serve every page with the ad interstitial button")
+    parser.add_argument("--pool-size", type=int, default=5)
+    parser.add_argument("--workers", type=int, default=5)
+    parser.add_argument("--parse-workers", type=int, default=0, help="Parse pages in this many worker processes")
+    parser.add_argument("--backend", choices=["selenium", "http"], default="selenium")
+    parser.add_argument("--bulk", action="store_true", help="Serve price and share from the fixture bulk files")
+    parser.add_argument("--format", default="xlsx")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed slowdown before a result counts as a regression")
+    parser.add_argument("--update-baseline", action="store_true", help="Record the results as the new baseline")
+    parser.add_argument("--child", choices=list(SCENARIOS), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        args.scenario = args.child
+        run_scenario(args)
+        return
+
+    baselines = {}
+    if os.path.exists(BASELINE_FILE):
+        with open(BASELINE_FILE, encoding="utf-8") as f:
+            baselines = json.load(f)
+    else:
+        print(f"No baseline at {BASELINE_FILE}, record one with --update-baseline")
+
+    scenarios = list(SCENARIOS) if args.scenario == "all" else [args.scenario]
+    results = {}
+    regressed = False
+    for scenario in scenarios:
+        # A fresh process per scenario keeps peak RSS and warm state separate
+        completed = subprocess.run(_child_command(args, scenario), cwd=REPO_DIR, capture_output=True, text=True)
+        lines = [line for line in completed.stdout.splitlines() if line.startswith(RESULT_PREFIX)]
+        if completed.returncode != 0 or not lines:
+            print(f"Scenario {scenario} failed:\n{completed.stderr[-2000:]}")
+            sys.exit(1)
+        result = json.loads(lines[-1][len(RESULT_PREFIX):])
+        results[scenario] = result
+        print(f"{scenario} ({result['stocks']} stocks)")
+        regressed = _compare(result, baselines.get(scenario), args.tolerance) or regressed
+
+    if args.update_baseline:
+        baselines.update(results)
+        with open(BASELINE_FILE, "w", encoding="utf-8") as f:
+            json.dump(baselines, f, indent=2)
+        print(f"Baseline written to {BASELINE_FILE}")
+    elif regressed:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
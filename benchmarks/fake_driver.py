@@ -0,0 +1,127 @@
+"""
+A stand-in for selenium's Chrome WebDriver that serves fixture pages.
+
+It implements the parts of the WebDriver API that StockCrawler and
+WebDriverWait use (get, page_source, find_element, current_url,
+get_cookies, quit), with configurable startup and page-load latency.
+"""
+from lxml import html as lxml_html
+from selenium.common.exceptions import NoSuchElementException, WebDriverException
+from selenium.webdriver.common.by import By
+from urllib.parse import urlsplit
+import threading
+import time
+
+AD_BUTTON = "<button id='ats-interstitial-button'>關閉</button>"
+
+class FakeElement:
+    def __init__(self, driver, element):
+        self._driver = driver
+        self._element = element
+
+    @property
+    def text(self):
+        return self._element.text_content()
+
+    def is_displayed(self):
+        return True
+
+    def is_enabled(self):
+        return True
+
+    def get_attribute(self, name):
+        return self._element.get(name)
+
+    def click(self):
+        self._driver._click(self._element)
+
+class FakeDriver:
+    """
+    Serve fixture pages keyed by goodinfo page name (URL path without .asp).
+    latency: seconds per page load, or {page: seconds}.
+    ad: whether each page starts with the ad interstitial button.
+    """
+
+    def __init__(self, pages, latency=0.0, startup=0.0, ad=False):
+        time.sleep(startup)  # Chrome process startup
+        self.pages = pages
+        self.latency = latency
+        self.ad = ad
+        self._url = "about:blank"
+        self.page = None
+        self._source = "<html><body></body></html>"
+        self._doc = None
+        self._quit = False
+        self._lock = threading.Lock()
+
+    def get(self, url):
+        self._check()
+        page = urlsplit(url).path.rsplit("/", 1)[-1].rsplit(".", 1)[0]
+        latency = self.latency.get(page, 0.0) if isinstance(self.latency, dict) else self.latency
+        time.sleep(latency)
+        if page not in self.pages:
+            raise WebDriverException(f"No fixture for {url}")
+        self._url = url
+        self.page = page
+        source = self.pages[page]
+        if self.ad:
+            source = source.replace("<body>", f"<body>{AD_BUTTON}", 1)
+        self._set_source(source)
+
+    @property
+    def current_url(self):
+        self._check()
+        return self._url
+
+    @property
+    def page_source(self):
+        self._check()
+        return self._source
+
+    def find_element(self, by=By.ID, value=None):
+        elements = self.find_elements(by, value)
+        if not elements:
+            raise NoSuchElementException(f"No element for {by}={value}")
+        return elements[0]
+
+    def find_elements(self, by=By.ID, value=None):
+        self._check()
+        if by == By.ID:
+            xpath = f"//*[@id='{value}']"
+        elif by == By.TAG_NAME:
+            xpath = f"//{value}"
+        elif by == By.XPATH:
+            xpath = value
+        elif by == By.CSS_SELECTOR:
+            return [FakeElement(self, element) for element in self._document().cssselect(value)]
+        else:
+            raise NotImplementedError(f"FakeDriver does not support locating by {by}")
+        return [FakeElement(self, element) for element in self._document().xpath(xpath)]
+
+    def get_cookies(self):
+        return []
+
+    def quit(self):
+        self._quit = True
+
+    def _click(self, element):
+        if element.get("id") == "ats-interstitial-button":
+            # Dismissing the ad removes it from the page
+            self._set_source(self._source.replace(AD_BUTTON, "", 1))
+        elif element.get("value") == "查5年" and self.page == "ShowK_ChartFlow":
+            self._set_source(self.pages["ShowK_ChartFlow_5y"])
+
+    def _set_source(self, source):
+        with self._lock:
+            self._source = source
+            self._doc = None
+
+    def _document(self):
+        with self._lock:
+            if self._doc is None:
+                self._doc = lxml_html.document_fromstring(self._source)
+            return self._doc
+
+    def _check(self):
+        if self._quit:
+            raise WebDriverException("Driver has been quit")
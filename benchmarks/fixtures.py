@@ -0,0 +1,151 @@
+"""
+Generate goodinfo-shaped pages for offline benchmarks.
+
+The pages only reproduce what StockCrawler reads: the tblDetail rows
+(row0, row1, ...) with the column layout of each page, the 查5年 button of
+the P/E page and the absolute XPath of the price cell on StockDetail.asp.
+Real pages saved from goodinfo.tw can replace the generated files as long
+as they keep the same names.
+
+Usage: python -m benchmarks.fixtures
+"""
+from datetime import date
+import json
+import os
+import random
+
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+# goodinfo page (URL path without .asp) -> fixture file; the P/E page has a second, 5-year version
+PAGE_FILES = {
+    "ShowSaleMonChart": "ShowSaleMonChart.html",
+    "StockBzPerformance": "StockBzPerformance.html",
+    "ShowK_ChartFlow": "ShowK_ChartFlow.html",
+    "ShowK_ChartFlow_5y": "ShowK_ChartFlow_5y.html",
+    "StockDetail": "StockDetail.html",
+    "EquityDistributionClassHis": "EquityDistributionClassHis.html",
+}
+
+# Saved copies of the TWSE bulk files for BulkQuotes, covering the benchmark's stock codes
+BULK_FILES = {
+    "quotes": "STOCK_DAY_ALL.json",
+    "listing": "t187ap03_L.json",
+}
+BULK_CODES = [str(2330 + i) for i in range(50)]
+
+def _page(title, body):
+    return (
+        "<!DOCTYPE html>\n<html><head><meta charset='utf-8'><title>"
+        f"{title}</title></head>\n<body>\n{body}\n</body></html>\n"
+    )
+
+def _detail_table(rows, extra=""):
+    lines = ["<table id='tblDetail'>", "<tbody>"]
+    for i, cells in enumerate(rows):
+        lines.append(f"<tr id='row{i}'>" + "".join(f"<td>{cell}</td>" for cell in cells) + "</tr>")
+    lines.append("</tbody>")
+    lines.append("</table>")
+    return extra + "\n".join(lines)
+
+def revenue_page(rng, today):
+    rows = []
+    year, month = today.year, today.month
+    for _ in range(36):
+        month -= 1
+        if month == 0:
+            year, month = year - 1, 12
+        revenue = rng.uniform(1500, 3000)
+        rows.append([f"{year}/{month:02d}"] + [f"{rng.uniform(0, 1000):.2f}" for _ in range(6)] + [f"{revenue:,.2f}"]
+                    + [f"{rng.uniform(-20, 40):.2f}" for _ in range(3)])
+    return _page("月營收", _detail_table(rows))
+
+def profit_page(rng, today):
+    rows = []
+    for offset in range(6):
+        margin = "-" if offset == 0 else f"{rng.uniform(20, 45):.2f}"  # The current year is still incomplete
+        rows.append([str(today.year - offset)] + [f"{rng.uniform(0, 100):.2f}" for _ in range(14)] + [margin]
+                    + [f"{rng.uniform(0, 100):.2f}" for _ in range(4)])
+    return _page("經營績效", _detail_table(rows))
+
+def pe_page(rng, today, weeks):
+    rows = []
+    year, week = today.year % 100, today.isocalendar()[1]
+    for _ in range(weeks):
+        week -= 1
+        if week == 0:
+            year, week = year - 1, 52
+        pe = f"{rng.uniform(10, 30):.2f}" if rng.random() > 0.01 else "-"
+        rows.append([f"{year:02d}W{week:02d}"] + [f"{rng.uniform(100, 1000):.2f}" for _ in range(4)] + [pe]
+                    + [f"{rng.uniform(0, 50):.2f}" for _ in range(4)])
+    button = "<input type='button' value='查1年'><input type='button' value='查5年'>\n"
+    return _page("本益比河流圖", _detail_table(rows, extra=button))
+
+def detail_page(rng):
+    price = f"{rng.uniform(500, 1200):,.2f}"
+    # Reproduce /html/body/table[2]/tbody/tr[2]/td[3]/main/table/tbody/tr/td[1]/section/table/tbody/tr[3]/td[1]
+    body = (
+        "<table><tbody><tr><td>header</td></tr></tbody></table>\n"
+        "<table><tbody><tr><td>nav</td></tr><tr><td></td><td></td><td><main>"
+        "<table><tbody><tr><td><section><table><tbody>"
+        "<tr><td>成交價</td></tr><tr><td>昨收</td></tr>"
+        f"<tr><td>{price}</td><td>0.00</td></tr>"
+        "</tbody></table></section></td></tr></tbody></table>"
+        "</main></td></tr></tbody></table>"
+    )
+    return _page("個股市況", body)
+
+def share_page(rng):
+    rows = [["週別", "", "", "", "", "股本"]]
+    for _ in range(10):
+        rows.append([f"{rng.randint(0, 99)}W{rng.randint(1, 52)}"] + [f"{rng.uniform(0, 100):.2f}" for _ in range(4)]
+                    + [f"{rng.uniform(1000, 3000):,.2f}"])
+    return _page("股權分散", _detail_table(rows))
+
+def bulk_files(rng, today, codes=BULK_CODES):
+    """
+    The daily quotes and listed company files in the TWSE open data JSON layout
+    """
+    roc_date = f"{today.year - 1911}{today.month:02d}{today.day:02d}"
+    quotes = [{"Date": roc_date, "Code": code, "Name": f"股票{code}", "TradeVolume": str(rng.randint(10**5, 10**8)),
+               "OpeningPrice": "", "HighestPrice": "", "LowestPrice": "", "ClosingPrice": f"{rng.uniform(10, 1000):.2f}",
+               "Change": "0.0000", "Transaction": str(rng.randint(100, 10**5))} for code in codes]
+    listing = [{"出表日期": roc_date, "公司代號": code, "公司名稱": f"股票{code}股份有限公司",
+                "實收資本額": str(rng.randint(10**9, 3 * 10**11))} for code in codes]
+    return {"quotes": quotes, "listing": listing}
+
+def generate(directory=FIXTURE_DIR, seed=2330, today=None):
+    """
+    Write every fixture page into `directory`
+    """
+    rng = random.Random(seed)
+    today = today or date(2025, 6, 15)  # Fixed so the fixtures are reproducible
+    pages = {
+        "ShowSaleMonChart": revenue_page(rng, today),
+        "StockBzPerformance": profit_page(rng, today),
+        "ShowK_ChartFlow": pe_page(rng, today, 52),
+        "ShowK_ChartFlow_5y": pe_page(rng, today, 260),
+        "StockDetail": detail_page(rng),
+        "EquityDistributionClassHis": share_page(rng),
+    }
+    os.makedirs(directory, exist_ok=True)
+    for page, html in pages.items():
+        with open(os.path.join(directory, PAGE_FILES[page]), "w", encoding="utf-8") as f:
+            f.write(html)
+    # A separate generator keeps the pages identical to earlier fixture sets
+    for name, records in bulk_files(random.Random(seed + 1), today).items():
+        with open(os.path.join(directory, BULK_FILES[name]), "w", encoding="utf-8") as f:
+            json.dump(records, f, ensure_ascii=False, indent=1)
+    return directory
+
+def load(directory=FIXTURE_DIR):
+    """
+    Read the fixture pages, {page: html}
+    """
+    pages = {}
+    for page, name in PAGE_FILES.items():
+        with open(os.path.join(directory, name), encoding="utf-8") as f:
+            pages[page] = f.read()
+    return pages
+
+if __name__ == "__main__":
+    print(f"Fixtures written to {generate()}")
@@ -0,0 +1,149 @@
+from datetime import datetime, timedelta
+from driver_pool import USER_AGENT
+from instrumentation import metrics
+from io import StringIO
+import csv
+import json
+import logging
+import os
+import threading
+import pandas as pd
+import requests
+
+logger = logging.getLogger(__name__)
+
+# TWSE open data: closing quotes of every listed stock, and the basic data of every listed company
+TWSE_QUOTES_URL = 'https://openapi.twse.com.tw/v1/exchangeReport/STOCK_DAY_ALL'
+TWSE_LISTING_URL = 'https://openapi.twse.com.tw/v1/opendata/t187ap03_L'
+
+# Field names of the code and value in each source (English in the quotes, Chinese in the listing)
+QUOTE_FIELDS = ('Code', 'ClosingPrice', 'Date')
+LISTING_FIELDS = ('公司代號', '實收資本額')
+
+class BulkQuotes:
+    """
+    Price and share number of the whole market from two daily bulk files,
+    fetched once and indexed by stock code, so a batch does not load one
+    StockDetail.asp and one EquityDistributionClassHis.asp page per stock.
+    Sources are URLs or paths of saved copies, in JSON (a list of records,
+    as served by the TWSE open data API) or CSV with the same field names.
+    Stocks missing from the files (e.g. OTC stocks) return None so the
+    crawler falls back to their pages. Data older than max_age is reloaded.
+    """
+    DATASETS = ('price', 'share')
+
+    def __init__(self, quotes=TWSE_QUOTES_URL, listing=TWSE_LISTING_URL, timeout=30, max_age=timedelta(hours=1)):
+        self.quotes = quotes
+        self.listing = listing
+        self.timeout = timeout
+        self.max_age = max_age
+        self.table = None  # DataFrame indexed by stock code: Price, Share, Year, Month
+        self._loaded_at = None
+        self._lock = threading.Lock()
+        self._load_lock = threading.Lock()
+
+    def load(self):
+        """
+        Download (or read) and index both sources; a source that fails leaves its column empty
+        """
+        quotes = self._records(self.quotes, QUOTE_FIELDS)
+        listing = self._records(self.listing, LISTING_FIELDS)
+        now = datetime.now()
+        price = pd.DataFrame({
+            'Price': pd.to_numeric(quotes['ClosingPrice'].str.replace(',', ''), errors='coerce'),
+            'Date': quotes['Date'].map(_quote_date),
+        }).set_axis(quotes['Code'].str.strip())
+        share = pd.DataFrame({
+            # Paid-in capital in NTD, the crawler's share number is in 億 (1e8) NTD
+            'Share': pd.to_numeric(listing['實收資本額'].str.replace(',', ''), errors='coerce') / 1e8,
+        }).set_axis(listing['公司代號'].str.strip())
+        table = price.join(share, how='outer')
+        dates = table['Date'].fillna(now)
+        table['Year'] = [date.year for date in dates]
+        table['Month'] = [date.month for date in dates]
+        table = table.drop(columns='Date')
+        table = table[~table.index.duplicated(keep='last')]
+        with self._lock:
+            self.table = table
+            self._loaded_at = now
+        logger.info("Loaded bulk quotes for %d stocks (%d prices, %d share numbers)",
+                    len(table), table['Price'].notna().sum(), table['Share'].notna().sum())
+        return table
+
+    def frame(self, stock_code, dataset):
+        """
+        One-row frame of the dataset in the crawler's columns, or None if the bulk files do not have it
+        """
+        table = self._table()
+        column = dataset.capitalize()
+        code = str(stock_code)
+        if code not in table.index or pd.isna(table.at[code, column]):
+            metrics.increment('bulk_misses', dataset=dataset)
+            return None
+        metrics.increment('bulk_hits', dataset=dataset)
+        row = table.loc[code]
+        if dataset == 'share':
+            # The listing is current, not tied to the quote date
+            now = datetime.now()
+            return pd.DataFrame([{'Year': now.year, 'Month': now.month, 'Share': float(row['Share'])}])
+        return pd.DataFrame([{'Year': int(row['Year']), 'Month': int(row['Month']), 'Price': float(row['Price'])}])
+
+    @property
+    def loaded_at(self):
+        """
+        When the bulk files in memory were downloaded, or None before the first load
+        """
+        with self._lock:
+            return self._loaded_at
+
+    def _table(self):
+        if self._fresh():
+            return self.table
+        # One download for all the threads asking at once
+        with self._load_lock:
+            if self._fresh():
+                return self.table
+            with metrics.timer('bulk_load'):
+                return self.load()
+
+    def _fresh(self):
+        with self._lock:
+            return self._loaded_at is not None and datetime.now() - self._loaded_at <= self.max_age
+
+    def _records(self, source, fields):
+        """
+        Rows of a source as a DataFrame of strings with at least `fields`
+        """
+        try:
+            text = _read(source, self.timeout)
+            if text.lstrip().startswith('['):
+                df = pd.DataFrame(json.loads(text), dtype=str)
+            else:
+                df = pd.DataFrame(list(csv.DictReader(StringIO(text))), dtype=str)
+            missing = [field for field in fields if field not in df]
+            if missing:
+                raise ValueError(f"missing fields {', '.join(missing)}")
+        except Exception as e:
+            logger.warning("Could not load bulk data from %s, falling back to per-stock pages: %s", source, e)
+            df = pd.DataFrame(columns=list(fields), dtype=str)
+        return df.fillna('')
+
+def _read(source, timeout):
+    if os.path.exists(source):
+        with open(source, encoding='utf-8-sig') as f:
+            return f.read()
+    response = requests.get(source, headers={'User-Agent': USER_AGENT, 'Accept': 'application/json, text/csv'},
+                            timeout=timeout)
+    response.raise_for_status()
+    response.encoding = 'utf-8'
+    return response.text
+
+def _quote_date(text):
+    # TWSE dates are in the ROC calendar, e.g. 1140613 is 2025-06-13
+    text = str(text).strip()
+    try:
+        if len(text) == 7 and text.isdigit():
+            return datetime(int(text[:3]) + 1911, int(text[3:5]), int(text[5:]))
+        return datetime.strptime(text, '%Y%m%d')
+    except ValueError:
+        return None
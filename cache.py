@@ -0,0 +1,150 @@
+from datetime import datetime, timedelta
+import logging
+import os
+import pickle
+import shutil
+import threading
+import uuid
+
+logger = logging.getLogger(__name__)
+
+# How long a fetched dataset stays fresh, based on how often goodinfo updates it
+DATASET_TTLS = {
+    'price': timedelta(minutes=15),
+    'pe': timedelta(days=7),
+    'revenue': timedelta(days=30),
+    'profit': timedelta(days=90),
+    'share': timedelta(days=30),
+}
+
+class ResultCache:
+    """
+    On-disk cache of parsed datasets keyed by stock code and dataset.
+    Entries expire after the dataset's TTL and the least recently used
+    entries are evicted once the cache grows beyond max_bytes, down to
+    low_water of it so a full cache is not walked again on the next put.
+    """
+
+    def __init__(self, directory='.crawler_cache', max_bytes=200 * 1024 * 1024, ttls=None, low_water=0.9):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.low_water = low_water
+        self.ttls = dict(DATASET_TTLS, **(ttls or {}))
+        self._lock = threading.Lock()
+        self._size = None  # Running total of the entry sizes, from one scan of the directory on the first put
+
+    def _path(self, stock_code, dataset):
+        return os.path.join(self.directory, str(stock_code), f"{dataset}.pkl")
+
+    def get(self, stock_code, dataset):
+        """
+        Return the cached DataFrame, or None if it is missing or expired
+        """
+        entry = self.entry(stock_code, dataset)
+        return None if entry is None else entry[1]
+
+    def entry(self, stock_code, dataset):
+        """
+        Return (fetched at, DataFrame) of a fresh entry, or None if it is missing or expired
+        """
+        path = self._path(stock_code, dataset)
+        try:
+            with open(path, 'rb') as f:
+                fetched_at, df = pickle.load(f)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.warning("Discarding unreadable cache entry %s: %s", path, e)
+            self._discard(path)
+            return None
+        if datetime.now() - fetched_at > self.ttls.get(dataset, timedelta(0)):
+            return None
+        try:
+            os.utime(path)  # The modification time tracks the last access for eviction
+        except OSError:
+            pass
+        return fetched_at, df
+
+    def put(self, stock_code, dataset, df):
+        """
+        Store a DataFrame, then evict old entries if the cache is over its size limit
+        """
+        path = self._path(stock_code, dataset)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write to a temporary file first so readers never see a partial entry
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp_path, 'wb') as f:
+            pickle.dump((datetime.now(), df), f, protocol=pickle.HIGHEST_PROTOCOL)
+        size = os.path.getsize(tmp_path)
+        with self._lock:
+            replaced = _size_of(path)
+            os.replace(tmp_path, path)
+            if self._size is None:
+                self._size = self._scan()[1]
+            else:
+                self._size += size - replaced
+            full = self._size > self.max_bytes
+        # Only walk the directory when the running total says the limit was crossed
+        if full:
+            self.evict()
+
+    def evict(self):
+        """
+        Remove least recently used entries until the cache fits in max_bytes, or low_water of it once over
+        """
+        with self._lock:
+            entries, total = self._scan()
+            limit = self.max_bytes * self.low_water if total > self.max_bytes else self.max_bytes
+            for _, size, path in sorted(entries):
+                if total <= limit:
+                    break
+                self._remove(path)
+                total -= size
+            self._size = total
+
+    def _scan(self):
+        """
+        Return ([(mtime, size, path) of every entry], total size)
+        """
+        entries = []
+        total = 0
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                if not name.endswith('.pkl'):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+                total += stat.st_size
+        return entries, total
+
+    def _discard(self, path):
+        """
+        Remove one entry outside of evict() and keep the running total in step
+        """
+        with self._lock:
+            size = _size_of(path)
+            if self._remove(path) and self._size is not None:
+                self._size -= size
+
+    def clear(self):
+        with self._lock:
+            shutil.rmtree(self.directory, ignore_errors=True)
+            self._size = 0
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+            return True
+        except OSError:
+            return False
+
+def _size_of(path):
+    try:
+        return os.path.getsize(path)
+    except OSError:
+        return 0
@@ -1,279 +1,308 @@
-from bs4 import BeautifulSoup
 from datetime import datetime
-from selenium import webdriver
-from selenium.webdriver.chrome.service import Service
-from selenium.webdriver.chrome.options import Options
+from driver_pool import DriverPool
+from errors import CrawlError, FetchTimeout, Blocked, ParseFailure
+from instrumentation import metrics
+from page_wait import default_waiter
+from parse_pool import inline_parser
+from parsers import to_frame
+from utils import is_empty_frame, page_name
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
-from selenium.common.exceptions import TimeoutException, NoSuchElementException
-import inspect
+from selenium.common.exceptions import TimeoutException
+import logging
 import pandas as pd
-import re
+
+logger = logging.getLogger(__name__)
+
+# Content that marks a data page as loaded
+DATA_TABLE = (By.ID, 'tblDetail')
 
 class StockCrawler:
     debug = True
+    BASE_URL = 'https://goodinfo.tw/tw'
+    # Dataset key -> method that fetches it
+    DATASETS = {
+        'revenue': 'get_revenue',
+        'profit': 'get_profit_ratio',
+        'pe': 'get_pe_ratio',
+        'price': 'get_current_stock_price',
+        'share': 'get_share_number',
+    }
+    # Dataset key -> goodinfo page serving it
+    PAGES = {
+        'revenue': 'ShowSaleMonChart.asp?STOCK_ID={stock_code}',
+        'profit': 'StockBzPerformance.asp?STOCK_ID={stock_code}',
+        'pe': 'ShowK_ChartFlow.asp?RPT_CAT=PER&STOCK_ID={stock_code}',
+        'price': 'StockDetail.asp?STOCK_ID={stock_code}',
+        'share': 'EquityDistributionClassHis.asp?STOCK_ID={stock_code}',
+    }
 
-    def __init__(self, stock_code):
+    def __init__(self, stock_code, pool=None, backend=None, base_url=None, cache=None, refresh=False, waiter=None,
+                 strict=False, parser=None, bulk=None):
         self.raw_stock_code = stock_code  # Raw stock code without .TW
-        # Set up Selenium Chrome driver
-        chrome_options = Options()
-        if not self.debug:
-            chrome_options.add_argument('--headless')  # Run in headless mode (no GUI)
-        chrome_options.add_argument('--disable-gpu')
-        chrome_options.add_argument('user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36')
-        # Specify path to chromedriver if not in PATH
-        # service = Service('/path/to/chromedriver')
-        self.driver = webdriver.Chrome(options=chrome_options)  # Use service=service if specifying path
+        self.base_url = base_url or self.BASE_URL  # Point at a local stub server to replay saved pages
+        # Optional lightweight backend (e.g. HttpBackend) tried before Selenium for static pages
+        self.backend = backend
+        # Optional ResultCache consulted by fetch(); refresh skips reads but still stores new results
+        self.cache = cache
+        self.refresh = refresh
+        # Page waits share one PageWaiter by default so timeouts adapt to the latency seen across crawlers
+        self.waiter = waiter or default_waiter
+        # Strict crawlers raise classified CrawlErrors instead of returning empty results, for the retry layer
+        self.strict = strict
+        # Pages are parsed in the calling thread unless a ParsePool hands them to worker processes
+        self.parser = parser or inline_parser
+        # Optional BulkQuotes serving price and share for the whole market; their pages become the fallback
+        self.bulk = bulk
+        # Optional throttle(url) called before every request to the site, e.g. AsyncCrawlEngine's rate limiter,
+        # so retries and fallbacks each wait for their own turn
+        self.throttle = None
+        # Dataset -> when the data fetch() last returned was downloaded (a cache hit keeps its original time)
+        self.fetched_at = {}
+        # Share drivers through a pool; a crawler without one gets a private single-driver pool
+        self._owns_pool = pool is None
+        self.pool = pool if pool is not None else DriverPool(size=1, headless=not self.debug)
     
-    def _fetch_page(self, url):
+    def url_for(self, dataset):
+        """
+        URL of the page serving one dataset
+        """
+        return f"{self.base_url}/{self.PAGES[dataset].format(stock_code=self.raw_stock_code)}"
+
+    def from_cache(self, dataset):
+        """
+        Return the cached dataset while it is fresh, or None
+        """
+        if self.cache is None or self.refresh:
+            return None
+        entry = self.cache.entry(self.raw_stock_code, dataset)
+        if entry is None:
+            metrics.increment('cache_misses', dataset=dataset)
+            return None
+        logger.info("Using cached %s data for stock %s", dataset, self.raw_stock_code)
+        metrics.increment('cache_hits', dataset=dataset)
+        self.fetched_at[dataset] = entry[0]
+        return entry[1]
+
+    def local_result(self, dataset):
+        """
+        Return the dataset when it needs no request to the site (a fresh cache entry, or price
+        and share from the bulk quotes), or None
+        """
+        df = self.from_cache(dataset)
+        if df is None and self.bulk is not None and dataset in self.bulk.DATASETS:
+            df = self.bulk.frame(self.raw_stock_code, dataset)
+            if df is not None:
+                self.fetched_at[dataset] = self.bulk.loaded_at
+        return df
+
+    def fetch(self, dataset, local=True):
+        """
+        Fetch one dataset by its key in DATASETS, served locally (cache or bulk quotes) when possible.
+        local=False skips that lookup, for callers that already got None from local_result()
+        """
+        df = self.local_result(dataset) if local else None
+        if df is not None:
+            return df
+        started = datetime.now()
+        with metrics.timer('fetch', stock=self.raw_stock_code, dataset=dataset):
+            df = getattr(self, self.DATASETS[dataset])()
+            if self.strict and is_empty_frame(df):
+                # Fetch failures have raised already, so the page had no readable data
+                self._failed(ParseFailure(f"No {dataset} data found for stock {self.raw_stock_code}"),
+                             page_name(self.url_for(dataset)))
+        # Never cache failed fetches, they would hide the data until the TTL expires
+        if not is_empty_frame(df):
+            self.fetched_at[dataset] = started
+            if self.cache is not None:
+                self.cache.put(self.raw_stock_code, dataset, df)
+        return df
+
+    def _fetch_page(self, driver, url, ready=(By.TAG_NAME, 'table')):
         """
-        Helper method to fetch page source with Selenium
+        Helper method to fetch page source with Selenium once `ready` is located
         """
+        page = page_name(url)
         try:
-            self.driver.get(url)
-            
-            # Attempt to close advertisement if present
-            try:
-                # Option 1: Look for common close button (adjust XPath/ID as needed)
-                close_button_xpath = "//button[@id='ats-interstitial-button']"
-                WebDriverWait(self.driver, 10).until(
-                    EC.element_to_be_clickable((By.XPATH, close_button_xpath))
-                )
-                close_button = self.driver.find_element(By.XPATH, close_button_xpath)
-                close_button.click()
-                print(f"Advertisement closed for {url}")
-            except (TimeoutException, NoSuchElementException):
-                print(f"No advertisement found or unable to close for {url}")
+            self._throttle(url)
+            with metrics.timer('page_load', stock=self.raw_stock_code, page=page):
+                driver.get(url)
             
-            # Wait for main content (table) to load after closing ad
-            WebDriverWait(self.driver, 10).until(
-                EC.presence_of_element_located((By.TAG_NAME, 'table'))
-            )
-            return self.driver.page_source
+            # Race the content against the ad interstitial (closed on sight) and an error page
+            result = self.waiter.wait(driver, page, ready)
+            if result.path == 'error':
+                raise Blocked(f"Error page instead of {url} after {result.elapsed:.1f}s")
+            if result.path == 'timeout':
+                raise FetchTimeout(f"Timed out after {result.elapsed:.1f}s waiting for {url}")
+            return driver.page_source
+        except CrawlError as e:
+            return self._failed(e, page)
+        except TimeoutException:
+            return self._failed(FetchTimeout(f"Timed out loading {url}"), page)
         except Exception as e:
-            print(f"Error fetching {url}: {e}")
-            return None
+            return self._failed(CrawlError(f"Error fetching {url}: {e}"), page)
+
+    def _throttle(self, url):
+        if self.throttle is not None:
+            self.throttle(url)
+
+    def _failed(self, error, page):
+        """
+        Raise the classified error in strict mode, otherwise log it and return None
+        so the caller falls back to its empty result
+        """
+        metrics.increment('crawl_errors', kind=error.kind, page=page)
+        if self.strict:
+            raise error
+        logger.error("%s", error)
+        return None
+
+    def _fetch(self, url, ready=(By.TAG_NAME, 'table')):
+        """
+        Fetch page source through the backend, falling back to a driver borrowed from the pool
+        when the backend gets the interstitial instead of the page. A refused or failed request
+        is not repeated in a browser.
+        """
+        if self.backend is not None:
+            self._throttle(url)
+            try:
+                html = self.backend.fetch(url)
+            except CrawlError as e:
+                return self._failed(e, page_name(url))
+            if html:
+                return html
+            metrics.increment('selenium_fallbacks', page=page_name(url))
+            logger.info("Falling back to Selenium for %s", url)
+        with self.pool.driver() as driver:
+            html = self._fetch_page(driver, url, ready)
+            if html and self.backend is not None:
+                # Let the backend reuse the cookies the browser session obtained
+                self.backend.seed_cookies(driver.get_cookies())
+            return html
     
     def get_revenue(self):
         """
         Fetch the last 36 months of revenue data from ShowSaleMonChart.asp
         """
-        print(f"Start to fetch {inspect.currentframe().f_code.co_name.split('_')[1]} data")
+        logger.info("Start to fetch revenue data for stock %s", self.raw_stock_code)
 
-        url = f"https://goodinfo.tw/tw/ShowSaleMonChart.asp?STOCK_ID={self.raw_stock_code}"
-        html = self._fetch_page(url)
+        url = self.url_for('revenue')
+        html = self._fetch(url, ready=DATA_TABLE)
         if not html:
             return pd.DataFrame()
 
-        soup = BeautifulSoup(html, 'html.parser')
-        revenue_data = []
-        revenue_table = soup.find('table', {'id': 'tblDetail'})
-        if revenue_table:
-            # Get rows from row0 to row35 (36 months)
-            for i in range(36):  # 0 to 35 inclusive
-                row = revenue_table.find('tr', {'id': f'row{i}'})
-                if row:
-                    cols = row.find_all('td')
-                    if len(cols) >= 8:  # Ensure there are at least 8 <td> elements
-                        year_month = cols[0].text.strip()  # First column is year/month
-                        revenue = cols[7].text.strip().replace(',', '')  # 8th column (index 7) is revenue
-                        if re.match(r'\d{4}/\d{2}', year_month):
-                            year, month = map(int, year_month.split('/'))
-                            revenue_data.append({
-                                'Year': year,
-                                'Month': month,
-                                'Revenue': float(revenue) if revenue else None
-                            })
-                        else:
-                            print(f"Invalid year/month format in row{i}: {year_month}")
-                else:
-                    print(f"Row {i} not found for stock {self.raw_stock_code}")
-                    break  # Stop if a row is missing
-        else:
-            print(f"Revenue table 'tblDetail' not found for stock {self.raw_stock_code}")
-        
-        revenue_df = pd.DataFrame(revenue_data)
-        if len(revenue_df) > 36:
-            # Ensure only the latest 36 months are returned
-            revenue_df = revenue_df.tail(36)
-        return revenue_df
+        with metrics.timer('parse', stock=self.raw_stock_code, dataset='revenue'):
+            return to_frame(self.parser.parse('revenue', html, self.raw_stock_code))
     
     def get_profit_ratio(self):
         """
         Fetch net profit margin data for the past 5 years from StockBzPerformance.asp
         """
-        print(f"Start to fetch {inspect.currentframe().f_code.co_name.split('_')[1]} data")
+        logger.info("Start to fetch profit data for stock %s", self.raw_stock_code)
 
-        url = f"https://goodinfo.tw/tw/StockBzPerformance.asp?STOCK_ID={self.raw_stock_code}"
-        html = self._fetch_page(url)
+        url = self.url_for('profit')
+        html = self._fetch(url, ready=DATA_TABLE)
         if not html:
             return pd.DataFrame()
 
-        soup = BeautifulSoup(html, 'html.parser')
-        profit_data = []
-        profit_table = soup.find('table', {'id': 'tblDetail'})
-        if profit_table:
-            # Iterate through rows (row0 to row5)
-            for i in range(6):  # 0 to 5 inclusive
-                row = profit_table.find('tr', {'id': f'row{i}'})
-                if row:
-                    cols = row.find_all('td')
-                    if len(cols) >= 16:  # Ensure there are at least 16 <td> elements
-                        year = cols[0].text.strip()  # First column is year
-                        net_profit_margin = cols[15].text.strip().replace('%', '')  # 16th column (index 15) is net profit margin 稅後淨利
-                        if re.match(r'\d{4}', year):
-                            # Skip if net profit margin is empty or invalid
-                            if not net_profit_margin or net_profit_margin == '-' or net_profit_margin == '':
-                                print(f"Skipping row{i} (Year {year}) due to empty or invalid profit margin")
-                                continue
-                            year = int(year)
-                            profit_data.append({
-                                'Year': year,
-                                'Month': 12,  # Annual data, default to December
-                                'Net Profit Margin': float(net_profit_margin)
-                            })
-                        else:
-                            print(f"Invalid year format in row{i}: {year}")
-                else:
-                    print(f"Row {i} not found for stock {self.raw_stock_code}")
-                    break
-        
-        profit_df = pd.DataFrame(profit_data)
-        if profit_df.empty:
-            print(f"No valid profit data parsed for stock {self.raw_stock_code}")
-            return profit_df
-        
-        # Ensure we have exactly 5 years of valid data
-        if len(profit_df) > 5:
-            profit_df = profit_df.tail(5)  # Take the latest 5 years
-        elif len(profit_df) < 5:
-            print(f"Warning: Only {len(profit_df)} years of valid profit data found for stock {self.raw_stock_code}")
-        
-        return profit_df
+        with metrics.timer('parse', stock=self.raw_stock_code, dataset='profit'):
+            return to_frame(self.parser.parse('profit', html, self.raw_stock_code))
     
     def get_pe_ratio(self):
         """
         Fetch the last 180 weeks of P/E ratio data from ShowK_ChartFlow.asp
         """
-        print(f"Start to fetch {inspect.currentframe().f_code.co_name.split('_')[1]} data")        
+        logger.info("Start to fetch pe data for stock %s", self.raw_stock_code)
 
-        url = f"https://goodinfo.tw/tw/ShowK_ChartFlow.asp?RPT_CAT=PER&STOCK_ID={self.raw_stock_code}"
-        html = self._fetch_page(url)
-        if not html:
-            return pd.DataFrame()
-        
-        try:
-            # Click the Expand year button
-            five_years_button_xpath = "//input[@value='查5年']"
-            WebDriverWait(self.driver, 10).until(
-                EC.element_to_be_clickable((By.XPATH, five_years_button_xpath))
-            )
-            self.driver.find_element(By.XPATH, five_years_button_xpath).click()
-            print(f"Clicked Expand Year button for stock {self.raw_stock_code}")
+        url = self.url_for('pe')
+        with self.pool.driver() as driver:
+            html = self._fetch_page(driver, url, ready=DATA_TABLE)
+            if not html:
+                return pd.DataFrame()
             
-            # Wait for the table to update with 5 years of data
-            WebDriverWait(self.driver, 10).until(
-                EC.presence_of_element_located((By.ID, 'row180'))
-            )
-            html = self.driver.page_source
-        except Exception as e:
-            print(f"Error loading page or clicking button for {self.raw_stock_code}: {e}")
-            return pd.DataFrame()
+            try:
+                # Click the Expand year button
+                five_years_button_xpath = "//input[@value='查5年']"
+                self.waiter.dismiss_ad(driver, 'ShowK_ChartFlow')  # A late interstitial would swallow the click
+                with metrics.timer('expand_click', stock=self.raw_stock_code):
+                    WebDriverWait(driver, 10).until(
+                        EC.element_to_be_clickable((By.XPATH, five_years_button_xpath))
+                    )
+                    self._throttle(url)  # The click loads five years of data from the site
+                    driver.find_element(By.XPATH, five_years_button_xpath).click()
+                    logger.info("Clicked Expand Year button for stock %s", self.raw_stock_code)
+                    
+                    # Wait for the table to update with 5 years of data
+                    WebDriverWait(driver, 10).until(
+                        EC.presence_of_element_located((By.ID, 'row180'))
+                    )
+                html = driver.page_source
+            except TimeoutException:
+                self._failed(FetchTimeout(f"Timed out expanding the P/E table of stock {self.raw_stock_code}"), 'ShowK_ChartFlow')
+                return pd.DataFrame()
+            except Exception as e:
+                self._failed(CrawlError(f"Error loading page or clicking button for {self.raw_stock_code}: {e}"), 'ShowK_ChartFlow')
+                return pd.DataFrame()
 
-        soup = BeautifulSoup(html, 'html.parser')
-        pe_data = []
-        pe_table = soup.find('table', {'id': 'tblDetail'})
-        if pe_table:
-            for i in range(180):  # 0 to 179 inclusive
-                row = pe_table.find('tr', {'id': f'row{i}'})
-                if row:
-                    cols = row.find_all('td')
-                    if len(cols) >= 6:  # Ensure there are at least 6 <td> elements
-                        week_str = cols[0].text.strip()  # First column is week (e.g., "25W13")
-                        pe_ratio = cols[5].text.strip()  # 6th column (index 5) is P/E ratio
-                        if re.match(r'\d{2}W\d{1,2}', week_str):
-                            year, week = week_str.split('W')
-                            year = "20" + year
-                            pe_data.append({
-                                'Year': year,
-                                'Week': week,
-                                'P/E Ratio': float(pe_ratio) if pe_ratio and pe_ratio != '-' else None
-                            })
-                        else:
-                            print(f"Invalid week format in row{i}: {week_str}")
-                else:
-                    print(f"Row {i} not found for stock {self.raw_stock_code}")
-                    break
-        else:
-            print(f"PE ratio table 'tblDetail' not found for stock {self.raw_stock_code}")
-        
-        pe_df = pd.DataFrame(pe_data)
-        if len(pe_df) > 180:
-            pe_df = pe_df.tail(180)  # Ensure only the latest 180 weeks
-        return pe_df
+        with metrics.timer('parse', stock=self.raw_stock_code, dataset='pe'):
+            return to_frame(self.parser.parse('pe', html, self.raw_stock_code))
     
     def get_current_stock_price(self):
         """
         Fetch the latest transaction price from StockDetail.asp using XPath
         """
-        print(f"Start to fetch {inspect.currentframe().f_code.co_name.split('_')[1]} data")
+        logger.info("Start to fetch price data for stock %s", self.raw_stock_code)
 
-        url = f"https://goodinfo.tw/tw/StockDetail.asp?STOCK_ID={self.raw_stock_code}"
-        html = self._fetch_page(url)
-        if not html:
-            return pd.DataFrame([{'Year': datetime.now().year, 'Month': datetime.now().month, 'Price': None}])
+        url = self.url_for('price')
+        with self.pool.driver() as driver:
+            html = self._fetch_page(driver, url)
+            if not html:
+                return pd.DataFrame([{'Year': datetime.now().year, 'Month': datetime.now().month, 'Price': None}])
         
-        try:
-            price_xpath = "/html/body/table[2]/tbody/tr[2]/td[3]/main/table/tbody/tr/td[1]/section/table/tbody/tr[3]/td[1]"
-            price_element = self.driver.find_element(By.XPATH, price_xpath)
-            price = price_element.text.strip().replace(',', '')
-            current_date = datetime.now()
-            return pd.DataFrame([{
-                'Year': current_date.year,
-                'Month': current_date.month,
-                'Price': float(price) if price else None
-            }])
-        except Exception as e:
-            print(f"Error finding price element for {self.raw_stock_code}: {e}")
-            return pd.DataFrame([{
-                'Year': datetime.now().year,
-                'Month': datetime.now().month,
-                'Price': None
-            }])
+            try:
+                price_xpath = "/html/body/table[2]/tbody/tr[2]/td[3]/main/table/tbody/tr/td[1]/section/table/tbody/tr[3]/td[1]"
+                with metrics.timer('parse', stock=self.raw_stock_code, dataset='price'):
+                    price_element = driver.find_element(By.XPATH, price_xpath)
+                    price = price_element.text.strip().replace(',', '')
+                current_date = datetime.now()
+                return pd.DataFrame([{
+                    'Year': current_date.year,
+                    'Month': current_date.month,
+                    'Price': float(price) if price else None
+                }])
+            except Exception as e:
+                self._failed(ParseFailure(f"Error finding price element for {self.raw_stock_code}: {e}"), 'StockDetail')
+                return pd.DataFrame([{
+                    'Year': datetime.now().year,
+                    'Month': datetime.now().month,
+                    'Price': None
+                }])
     
     def get_share_number(self):
         """
-        Fetch the latest share number
+        Fetch the latest share number from EquityDistributionClassHis.asp
         """
-        print(f"Start to fetch {inspect.currentframe().f_code.co_name.split('_')[1]} data")
+        logger.info("Start to fetch share data for stock %s", self.raw_stock_code)
 
-        url = f"https://goodinfo.tw/tw/EquityDistributionClassHis.asp?STOCK_ID={self.raw_stock_code}"
-        html = self._fetch_page(url)
+        url = self.url_for('share')
+        html = self._fetch(url)
         if not html:
             return pd.DataFrame([{'Year': datetime.now().year, 'Month': datetime.now().month, 'Share': None}])
         
-        try:                
-            soup = BeautifulSoup(html, 'html.parser')
-            row = soup.find('tr', {'id': 'row1'})
-            cols = row.find_all('td')
-            share = cols[5].text.strip().replace(',', '')
-            current_date = datetime.now()
-            return pd.DataFrame([{
-                'Year': current_date.year,
-                'Month': current_date.month,
-                'Share': float(share) if share else None
-            }])
-        except Exception as e:
-            print(f"Error finding Share element for {self.raw_stock_code}: {e}")
-            return pd.DataFrame([{
-                'Year': datetime.now().year,
-                'Month': datetime.now().month,
-                'Share': None
-            }])
+        with metrics.timer('parse', stock=self.raw_stock_code, dataset='share'):
+            return to_frame(self.parser.parse('share', html, self.raw_stock_code))
     
+    def close(self):
+        """
+        Clean up by shutting down the driver pool if this crawler created it
+        """
+        if self._owns_pool:
+            self.pool.shutdown()
+
     def __del__(self):
         """
         Clean up by closing the driver
         """
-        self.driver.quit()
\ No newline at end of file
+        if getattr(self, '_owns_pool', False):
+            self.pool.shutdown()
\ No newline at end of file
@@ -0,0 +1,213 @@
+from contextlib import contextmanager
+from instrumentation import metrics
+from selenium import webdriver
+from selenium.webdriver.chrome.options import Options
+import logging
+import queue
+import threading
+
+logger = logging.getLogger(__name__)
+
+USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+
+# Resources a lean browser never downloads: we only read the HTML tables
+LEAN_BLOCKED_URLS = [
+    # Images, stylesheets, fonts and media
+    '*.png', '*.jpg', '*.jpeg', '*.gif', '*.webp', '*.svg', '*.ico', '*.bmp',
+    '*.css', '*.woff', '*.woff2', '*.ttf', '*.otf', '*.eot',
+    '*.mp4', '*.webm', '*.mp3', '*.m4a',
+    # Ad and analytics networks
+    '*googlesyndication.com*', '*doubleclick.net*', '*googleadservices.com*', '*adservice.google.*',
+    '*googletagmanager.com*', '*googletagservices.com*', '*google-analytics.com*', '*adsystem.com*',
+    '*facebook.net*', '*connect.facebook.*', '*scorecardresearch.com*', '*criteo.*', '*taboola.com*',
+    '*outbrain.com*', '*adnxs.com*', '*pubmatic.com*', '*rubiconproject.com*', '*casalemedia.com*',
+    '*amazon-adsystem.com*', '*clarity.ms*', '*hotjar.com*',
+]
+
+# Flags trading features we do not use for a smaller browser footprint
+LEAN_ARGUMENTS = [
+    '--blink-settings=imagesEnabled=false',
+    '--disable-extensions',
+    '--disable-dev-shm-usage',  # /dev/shm is small in containers, use /tmp instead
+    '--disable-background-networking',
+    '--disable-background-timer-throttling',
+    '--disable-component-update',
+    '--disable-default-apps',
+    '--disable-sync',
+    '--disable-features=Translate,MediaRouter,OptimizationHints,AutofillServerCommunication',
+    '--no-first-run',
+    '--mute-audio',
+    '--renderer-process-limit=2',
+    '--js-flags=--max-old-space-size=256',
+    '--window-size=1280,900',
+]
+
+def create_chrome_driver(headless=False, lean=False):
+    """
+    Start a new Selenium Chrome driver with the crawler's default options.
+    A lean driver runs headless, returns from get() once the DOM is parsed
+    (eager page loads), blocks images, fonts, media and ad/analytics requests
+    and uses memory-saving flags.
+    """
+    chrome_options = Options()
+    if headless or lean:
+        chrome_options.add_argument('--headless=new' if lean else '--headless')  # Run in headless mode (no GUI)
+    chrome_options.add_argument('--disable-gpu')
+    chrome_options.add_argument(f'user-agent={USER_AGENT}')
+    if lean:
+        # The page waiter polls for the data table, so get() need not wait for subresources
+        chrome_options.page_load_strategy = 'eager'
+        for argument in LEAN_ARGUMENTS:
+            chrome_options.add_argument(argument)
+        chrome_options.add_experimental_option('prefs', {
+            'profile.managed_default_content_settings.images': 2,
+            'profile.default_content_setting_values.notifications': 2,
+        })
+    # Specify path to chromedriver if not in PATH
+    # service = Service('/path/to/chromedriver')
+    driver = webdriver.Chrome(options=chrome_options)  # Use service=service if specifying path
+    if lean:
+        block_requests(driver, LEAN_BLOCKED_URLS)
+    return driver
+
+def block_requests(driver, patterns):
+    """
+    Make the browser fail requests matching the URL patterns ('*' wildcards) through the DevTools protocol
+    """
+    try:
+        driver.execute_cdp_cmd('Network.enable', {})
+        driver.execute_cdp_cmd('Network.setBlockedURLs', {'urls': list(patterns)})
+    except Exception as e:
+        logger.warning("Could not block requests in the browser: %s", e)
+
+class DriverPool:
+    """
+    Bounded pool of WebDriver instances shared across fetches and stocks.
+    Drivers are started lazily on first demand, health-checked before being
+    handed out and reused until shutdown() is called.
+    """
+
+    def __init__(self, size=5, headless=False, factory=None, lean=False):
+        if size < 1:
+            raise ValueError("Driver pool size must be at least 1")
+        self.size = size
+        self.headless = headless
+        self.lean = lean
+        self.factory = factory or (lambda: create_chrome_driver(headless=self.headless, lean=self.lean))
+        self._idle = queue.LifoQueue()  # Reuse the most recently used (warm) driver first
+        self._slots = threading.Semaphore(size)
+        self._lock = threading.Lock()
+        self._drivers = []
+        self._closed = False
+
+    def acquire(self, timeout=None):
+        """
+        Take a healthy driver out of the pool, starting one if none is idle
+        """
+        if self._closed:
+            raise RuntimeError("Driver pool has been shut down")
+        if not self._slots.acquire(timeout=timeout):
+            raise TimeoutError(f"No driver available within {timeout}s")
+        try:
+            while True:
+                try:
+                    driver = self._idle.get_nowait()
+                except queue.Empty:
+                    return self._start_driver()
+                if self._is_healthy(driver):
+                    return driver
+                metrics.increment('drivers_discarded')
+                logger.warning("Discarding unhealthy driver from pool")
+                self._discard(driver)
+        except Exception:
+            self._slots.release()
+            raise
+
+    def release(self, driver, broken=False):
+        """
+        Return a driver to the pool, or quit it if it is broken or the pool is closed
+        """
+        try:
+            if broken or self._closed:
+                self._discard(driver)
+            else:
+                self._idle.put(driver)
+        finally:
+            self._slots.release()
+
+    @contextmanager
+    def driver(self, timeout=None):
+        """
+        Context manager that borrows a driver for the duration of the block
+        """
+        driver = self.acquire(timeout=timeout)
+        broken = False
+        try:
+            yield driver
+        except Exception:
+            # The driver may be left in an unknown state, check it before reuse
+            broken = not self._is_healthy(driver)
+            raise
+        finally:
+            self.release(driver, broken=broken)
+
+    def warm(self, count=None):
+        """
+        Start drivers ahead of demand so the first fetches skip browser startup
+        """
+        drivers = []
+        try:
+            for _ in range(min(count or self.size, self.size)):
+                drivers.append(self.acquire())
+        finally:
+            for driver in drivers:
+                self.release(driver)
+
+    def shutdown(self):
+        """
+        Quit every driver started by this pool
+        """
+        with self._lock:
+            self._closed = True
+            drivers, self._drivers = self._drivers, []
+        while True:
+            try:
+                self._idle.get_nowait()
+            except queue.Empty:
+                break
+        for driver in drivers:
+            try:
+                driver.quit()
+            except Exception as e:
+                logger.warning("Error quitting driver: %s", e)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.shutdown()
+
+    def _start_driver(self):
+        with metrics.timer('driver_start'):
+            driver = self.factory()
+        logger.info("Started driver %d of %d", len(self._drivers) + 1, self.size)
+        with self._lock:
+            self._drivers.append(driver)
+        return driver
+
+    def _discard(self, driver):
+        with self._lock:
+            if driver in self._drivers:
+                self._drivers.remove(driver)
+        try:
+            driver.quit()
+        except Exception:
+            pass
+
+    @staticmethod
+    def _is_healthy(driver):
+        try:
+            driver.current_url  # Raises if the browser or session has gone away
+            return True
+        except Exception:
+            return False
@@ -0,0 +1,177 @@
+from concurrent.futures import ThreadPoolExecutor
+from jobs import JobControl
+from urllib.parse import urlsplit
+import asyncio
+import time
+
+class TokenBucket:
+    """
+    Token bucket allowing `rate` requests per second with bursts of up to `capacity`
+    """
+
+    def __init__(self, rate, capacity=1):
+        if rate <= 0:
+            raise ValueError("Token bucket rate must be positive")
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = None
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        # Serialize waiters so tokens are handed out in FIFO order
+        async with self._lock:
+            loop = asyncio.get_running_loop()
+            while True:
+                now = loop.time()
+                if self._updated is not None:
+                    self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+class HostRateLimiter:
+    """
+    One token bucket per host, so each site gets its own request budget
+    """
+
+    def __init__(self, rate=1.0, burst=2, overrides=None):
+        self.rate = rate
+        self.burst = burst
+        self.overrides = overrides or {}  # host -> (rate, burst)
+        self._buckets = {}
+        self._loop = None
+
+    async def acquire(self, url):
+        # Buckets hold asyncio primitives bound to one event loop, start over on a new loop
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            self._loop = loop
+            self._buckets = {}
+        host = urlsplit(url).hostname or ''
+        if host not in self._buckets:
+            rate, burst = self.overrides.get(host, (self.rate, self.burst))
+            self._buckets[host] = TokenBucket(rate, burst)
+        await self._buckets[host].acquire()
+
+class AsyncCrawlEngine:
+    """
+    Drive the dataset fetches of many stocks from one event loop.
+    Every request a job sends (retries and fallbacks included) waits for its
+    host's rate limiter, at most `max_in_flight` jobs run at once and a job
+    is abandoned once one of its fetch attempts takes longer than `timeout`
+    seconds (breaker pauses and retry backoff do not count).
+    The crawler methods are blocking (Selenium / requests), so they run on a
+    dedicated thread pool sized to max_in_flight.
+    """
+
+    def __init__(self, max_in_flight=5, rate_limiter=None, timeout=180):
+        self.max_in_flight = max_in_flight
+        self.rate_limiter = rate_limiter or HostRateLimiter()
+        self.timeout = timeout
+
+    async def _run_job(self, crawler, dataset, slots, executor, fetch):
+        # Cached data and bulk quotes need neither a request token nor a fetch slot; reading them
+        # (or downloading the bulk files once) blocks, so it runs on the loop's default executor
+        df = await asyncio.get_running_loop().run_in_executor(None, crawler.local_result, dataset)
+        if df is not None:
+            return df
+        await slots.acquire()
+        job = JobControl()
+        job.local = False  # Looked up above, a second lookup would count the miss twice
+        try:
+            future = asyncio.get_running_loop().run_in_executor(executor, fetch, crawler, dataset, job)
+        except BaseException:
+            slots.release()
+            raise
+
+        def finished(future):
+            # A worker thread cannot be interrupted, so its slot is only freed once it really finishes
+            slots.release()
+            if not future.cancelled():
+                future.exception()  # Nobody awaits an abandoned job, mark its outcome as seen
+
+        future.add_done_callback(finished)
+        try:
+            while True:
+                started = job.attempt_started
+                remaining = self.timeout if started is None else started + self.timeout - time.monotonic()
+                if remaining <= 0:
+                    raise TimeoutError(f"Fetching {dataset} for stock {crawler.raw_stock_code} timed out after {self.timeout}s")
+                # wait() leaves the future running when it times out or this task is cancelled
+                done, _ = await asyncio.wait({future}, timeout=remaining)
+                if done:
+                    return future.result()
+        except BaseException:
+            # Stop the worker before its next breaker wait, retry or backoff
+            job.cancel()
+            raise
+
+    async def run(self, jobs, on_result=None, fetch=None):
+        """
+        Run (crawler, dataset) jobs and return {(stock_code, dataset): result or exception}.
+        on_result(stock_code, dataset, result, error) is called as each job completes, one call at
+        a time on a writer thread so slow callbacks do not block the event loop.
+        fetch(crawler, dataset, job) replaces crawler.fetch, e.g. with JobRunner.run for retries;
+        it must mark its fetch attempts on the JobControl `job` and stop once the job is cancelled.
+        Cancelling run() cancels every pending job. run() returns once the worker threads have
+        stopped, so abandoned jobs never send requests without the rate limiter.
+        """
+        fetch = fetch or _fetch
+        jobs = list(jobs)
+        slots = asyncio.Semaphore(self.max_in_flight)
+        executor = ThreadPoolExecutor(max_workers=self.max_in_flight)
+        # One thread runs every on_result call, so callbacks never run concurrently
+        writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix='on_result')
+        results = {}
+        loop = asyncio.get_running_loop()
+
+        def throttle(url):
+            # Called from the worker threads before each request, blocks until the host has a token
+            if not loop.is_closed():
+                asyncio.run_coroutine_threadsafe(self.rate_limiter.acquire(url), loop).result()
+
+        crawlers = {id(crawler): crawler for crawler, _ in jobs}
+        previous = {key: crawler.throttle for key, crawler in crawlers.items()}
+        for crawler in crawlers.values():
+            crawler.throttle = throttle
+
+        async def run_one(crawler, dataset):
+            key = (crawler.raw_stock_code, dataset)
+            try:
+                result, error = await self._run_job(crawler, dataset, slots, executor, fetch), None
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                result, error = None, e
+            results[key] = error if error is not None else result
+            if on_result is not None:
+                # Callbacks store and write results, which must not stall the token grants and job starts
+                await loop.run_in_executor(writer, on_result, key[0], dataset, result, error)
+
+        tasks = [asyncio.ensure_future(run_one(crawler, dataset)) for crawler, dataset in jobs]
+        try:
+            await asyncio.gather(*tasks)
+        finally:
+            for task in tasks:
+                task.cancel()
+            # Wait for the tasks to cancel their jobs, then for the workers still finishing an attempt;
+            # they keep calling throttle() meanwhile, so the loop must keep running
+            await asyncio.gather(*tasks, return_exceptions=True)
+            await loop.run_in_executor(None, executor.shutdown)
+            for key, crawler in crawlers.items():
+                crawler.throttle = previous[key]
+            writer.shutdown(wait=False)
+        return results
+
+    def run_sync(self, jobs, on_result=None, fetch=None):
+        """
+        Blocking entry point for callers outside an event loop
+        """
+        return asyncio.run(self.run(jobs, on_result=on_result, fetch=fetch))
+
+def _fetch(crawler, dataset, job):
+    with job.attempt():
+        return crawler.fetch(dataset, local=job.local)
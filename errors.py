@@ -0,0 +1,34 @@
+class CrawlError(Exception):
+    """
+    A fetch that did not produce data. `kind` names the failure class for logs
+    and metrics; `retryable` says whether trying again may help,
+    `trips_breaker` whether it suggests the site is refusing us and
+    `answered` whether the site served a page, which shows it is not.
+    """
+    kind = 'error'
+    retryable = True
+    trips_breaker = False
+    answered = False
+
+class FetchTimeout(CrawlError):
+    """
+    The page or one of its elements did not load in time
+    """
+    kind = 'timeout'
+    trips_breaker = True
+
+class Blocked(CrawlError):
+    """
+    The site refused the request: an error or throttling page, a refusal or
+    server error status, or a dropped connection
+    """
+    kind = 'blocked'
+    trips_breaker = True
+
+class ParseFailure(CrawlError):
+    """
+    The page loaded but the expected data could not be read from it
+    """
+    kind = 'parse'
+    retryable = False
+    answered = True
@@ -0,0 +1,88 @@
+from driver_pool import USER_AGENT
+from errors import Blocked, CrawlError, FetchTimeout
+from instrumentation import metrics
+from requests.adapters import HTTPAdapter
+from utils import page_name
+import logging
+import requests
+
+logger = logging.getLogger(__name__)
+
+class FetchBackend:
+    """
+    Interface for fetching the HTML of a goodinfo page without user interaction.
+    fetch() returns the page source, or None when the backend cannot serve the
+    page so the caller can fall back to Selenium. It raises a CrawlError when
+    the site refused or failed the request, which a browser would not fix.
+    """
+
+    def fetch(self, url):
+        raise NotImplementedError
+
+    def seed_cookies(self, cookies):
+        """
+        Accept cookies collected by a browser session (list of Selenium cookie dicts)
+        """
+        pass
+
+    def close(self):
+        pass
+
+class HttpBackend(FetchBackend):
+    """
+    Keep-alive HTTP client backed by a pooled requests.Session.
+    Pages are only accepted when they contain the marker element (the
+    tblDetail table by default); a 200 without it is the site's
+    cookie/redirect interstitial and is treated as a miss. Refusals
+    (403/429), server errors (5xx) and dropped connections raise Blocked
+    so the circuit breaker sees them.
+    """
+    REFUSED = (403, 429, 500, 502, 503, 504)
+
+    def __init__(self, pool_size=10, timeout=15, marker='tblDetail'):
+        self.timeout = timeout
+        self.marker = marker
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.session.headers.update({
+            'User-Agent': USER_AGENT,
+            'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
+            'Accept-Language': 'zh-TW,zh;q=0.9,en;q=0.8',
+        })
+
+    def fetch(self, url):
+        page = page_name(url)
+        try:
+            # goodinfo rejects requests without a same-site referer
+            with metrics.timer('http_fetch', page=page):
+                response = self.session.get(url, headers={'Referer': url}, timeout=self.timeout)
+        except requests.Timeout as e:
+            raise FetchTimeout(f"HTTP fetch timed out for {url}: {e}")
+        except requests.ConnectionError as e:
+            # Refused or reset connections are how a site drops a client it has banned
+            raise Blocked(f"HTTP connection for {url} was refused or dropped: {e}")
+        except requests.RequestException as e:
+            raise CrawlError(f"HTTP fetch failed for {url}: {e}")
+        metrics.increment('http_responses', page=page, status=response.status_code)
+        if response.status_code in self.REFUSED:
+            raise Blocked(f"HTTP fetch for {url} was refused with status {response.status_code}")
+        if response.status_code != 200:
+            raise CrawlError(f"HTTP fetch for {url} returned status {response.status_code}")
+        response.encoding = 'utf-8'
+        html = response.text
+        if self.marker and self.marker not in html:
+            logger.warning("HTTP fetch for %s did not return the expected page", url)
+            return None
+        return html
+
+    def seed_cookies(self, cookies):
+        for cookie in cookies:
+            self.session.cookies.set(
+                cookie['name'], cookie['value'],
+                domain=cookie.get('domain'), path=cookie.get('path', '/')
+            )
+
+    def close(self):
+        self.session.close()
@@ -0,0 +1,158 @@
+from contextlib import closing
+from datetime import datetime
+import pandas as pd
+import sqlite3
+import threading
+
+# Dataset key -> (table, [(DataFrame column, SQL column)] of the key, (DataFrame column, SQL column) of the value)
+SCHEMAS = {
+    'revenue': ('revenue', [('Year', 'year'), ('Month', 'month')], ('Revenue', 'revenue')),
+    'profit': ('profit', [('Year', 'year'), ('Month', 'month')], ('Net Profit Margin', 'net_profit_margin')),
+    'pe': ('pe', [('Year', 'year'), ('Week', 'week')], ('P/E Ratio', 'pe_ratio')),
+    'price': ('price', [('Year', 'year'), ('Month', 'month')], ('Price', 'price')),
+    'share': ('share', [('Year', 'year'), ('Month', 'month')], ('Share', 'share')),
+}
+
+class HistoryStore:
+    """
+    Persistent SQLite store of every dataset row ever fetched, per stock.
+    Rows are deduplicated on (Year, Month) / (Year, Week), so repeated
+    fetches only add new periods and revised values, and any window of history can
+    be loaded back without crawling again.
+    """
+
+    def __init__(self, path='history.db'):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        with self._conn:
+            for table, keys, (_, value) in SCHEMAS.values():
+                key_columns = ', '.join(f"{column} INTEGER NOT NULL" for _, column in keys)
+                key_names = ', '.join(column for _, column in keys)
+                self._conn.execute(
+                    f"CREATE TABLE IF NOT EXISTS {table} ("
+                    f"stock_code TEXT NOT NULL, {key_columns}, {value} REAL, "
+                    f"PRIMARY KEY (stock_code, {key_names}))"
+                )
+            # When each dataset of each stock was last fetched successfully, for the refresh scheduler
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS fetch_log ("
+                "stock_code TEXT NOT NULL, dataset TEXT NOT NULL, fetched_at TEXT NOT NULL, "
+                "PRIMARY KEY (stock_code, dataset))"
+            )
+
+    def append(self, stock_code, dataset, df):
+        """
+        Store the rows of a fetched DataFrame: new periods are inserted and a
+        stored period takes the fetched value when it differs (revised or
+        completed figures), but a missing value never erases a stored one.
+        Return how many rows were written.
+        """
+        table, keys, (value_name, value) = SCHEMAS[dataset]
+        if df is None or df.empty or any(name not in df for name, _ in keys) or value_name not in df:
+            return 0
+        key_values = [df[name].astype(int).tolist() for name, _ in keys]
+        values = [None if pd.isna(v) else float(v) for v in df[value_name]]
+        rows = [(str(stock_code), *key, v) for *key, v in zip(*key_values, values)]
+        columns = ', '.join(['stock_code'] + [column for _, column in keys] + [value])
+        placeholders = ', '.join('?' * (len(keys) + 2))
+        key_names = ', '.join(['stock_code'] + [column for _, column in keys])
+        # The WHERE clause skips unchanged rows so they are not counted as written
+        query = (
+            f"INSERT INTO {table} ({columns}) VALUES ({placeholders}) "
+            f"ON CONFLICT ({key_names}) DO UPDATE SET {value} = COALESCE(excluded.{value}, {value}) "
+            f"WHERE excluded.{value} IS NOT NULL AND {value} IS NOT excluded.{value}"
+        )
+        with self._lock, self._conn:
+            before = self._conn.total_changes
+            self._conn.executemany(query, rows)
+            return self._conn.total_changes - before
+
+    def load(self, stock_code, dataset, window=None):
+        """
+        Load the newest `window` rows (all rows if None) newest first, in the
+        same columns and order as the crawler returns them
+        """
+        table, keys, (value_name, value) = SCHEMAS[dataset]
+        order = ', '.join(f"{column} DESC" for _, column in keys)
+        query = (
+            f"SELECT {', '.join(column for _, column in keys)}, {value} FROM {table} "
+            f"WHERE stock_code = ? ORDER BY {order}"
+        )
+        params = [str(stock_code)]
+        if window is not None:
+            query += " LIMIT ?"
+            params.append(int(window))
+        with self._lock:
+            df = pd.read_sql_query(query, self._conn, params=params)
+        df.columns = [name for name, _ in keys] + [value_name]
+        return df
+
+    def load_all(self, dataset, stock_codes=None, window=None):
+        """
+        Load the newest `window` rows of every stock (or of the given stocks) in
+        one query, as a long DataFrame with a 'Stock Code' column, newest first per stock
+        """
+        table, keys, (value_name, value) = SCHEMAS[dataset]
+        order = ', '.join(f"{column} DESC" for _, column in keys)
+        key_names = ', '.join(column for _, column in keys)
+        query = (
+            f"SELECT stock_code, {key_names}, {value} FROM ("
+            f"SELECT *, ROW_NUMBER() OVER (PARTITION BY stock_code ORDER BY {order}) AS position FROM {table}"
+            f")"
+        )
+        conditions, params = [], []
+        if window is not None:
+            conditions.append("position <= ?")
+            params.append(int(window))
+        if stock_codes is not None:
+            stock_codes = [str(code) for code in stock_codes]
+            conditions.append(f"stock_code IN ({', '.join('?' * len(stock_codes))})")
+            params.extend(stock_codes)
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        query += " ORDER BY stock_code, position"
+        with self._lock:
+            df = pd.read_sql_query(query, self._conn, params=params)
+        df.columns = ['Stock Code'] + [name for name, _ in keys] + [value_name]
+        return df
+
+    def record_fetch(self, stock_code, dataset, fetched_at=None):
+        """
+        Log a successful fetch of one dataset, downloaded at `fetched_at` (now if None).
+        An older time (e.g. of a cache entry) never replaces a newer one.
+        """
+        fetched_at = fetched_at or datetime.now()
+        with self._lock, self._conn:
+            # ISO timestamps compare in time order as strings
+            self._conn.execute(
+                "INSERT INTO fetch_log (stock_code, dataset, fetched_at) VALUES (?, ?, ?) "
+                "ON CONFLICT (stock_code, dataset) DO UPDATE SET fetched_at = MAX(fetched_at, excluded.fetched_at)",
+                (str(stock_code), dataset, fetched_at.isoformat(timespec='seconds'))
+            )
+
+    def last_fetched(self, stock_codes=None):
+        """
+        {(stock code, dataset): datetime of the last successful fetch}
+        """
+        query, params = "SELECT stock_code, dataset, fetched_at FROM fetch_log", []
+        if stock_codes is not None:
+            stock_codes = [str(code) for code in stock_codes]
+            query += f" WHERE stock_code IN ({', '.join('?' * len(stock_codes))})"
+            params = stock_codes
+        with self._lock, closing(self._conn.cursor()) as cursor:
+            cursor.execute(query, params)
+            return {(code, dataset): datetime.fromisoformat(fetched_at) for code, dataset, fetched_at in cursor.fetchall()}
+
+    def stock_codes(self):
+        """
+        Every stock code with at least one stored row
+        """
+        with self._lock, closing(self._conn.cursor()) as cursor:
+            cursor.execute(" UNION ".join(f"SELECT stock_code FROM {table}" for table, _, _ in SCHEMAS.values()))
+            return sorted(row[0] for row in cursor.fetchall())
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
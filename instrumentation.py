@@ -0,0 +1,150 @@
+from contextlib import nullcontext
+import json
+import logging
+import os
+import threading
+import time
+
+LOG_FORMAT = "%(asctime)s %(levelname)s [%(threadName)s] %(name)s: %(message)s"
+
+def setup_logging(level="INFO", log_file=None):
+    """
+    Configure the root logger for the command line entry points; level is a name or a logging level number
+    """
+    if not isinstance(level, int):
+        level = getattr(logging, str(level).upper(), logging.INFO)
+    handlers = [logging.StreamHandler()]
+    if log_file:
+        handlers.append(logging.FileHandler(log_file, encoding="utf-8"))
+    logging.basicConfig(level=level, format=LOG_FORMAT,
+                        handlers=handlers, force=True)
+    # Selenium and urllib3 are chatty at INFO
+    for name in ("selenium", "urllib3"):
+        logging.getLogger(name).setLevel(max(logging.WARNING, logging.getLogger().level))
+
+_DISABLED = nullcontext()
+
+class _Timer:
+    __slots__ = ("metrics", "key", "start")
+
+    def __init__(self, metrics, key):
+        self.metrics = metrics
+        self.key = key
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.metrics._observe(self.key, time.perf_counter() - self.start)
+        if exc_type is not None:
+            self.metrics._count((self.key[0] + "_errors", self.key[1]), 1)
+        return False
+
+class Metrics:
+    """
+    Thread-safe registry of timers and counters labelled by stock, dataset, etc.
+    While disabled, timer() returns a shared no-op context manager and
+    increment() returns immediately, so instrumented code pays next to nothing.
+    """
+
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._timers = {}    # (name, labels) -> [count, total seconds, max seconds]
+        self._counters = {}  # (name, labels) -> value
+
+    def timer(self, name, **labels):
+        """
+        Context manager timing the block as `name`; an exception also counts as `<name>_errors`
+        """
+        if not self.enabled:
+            return _DISABLED
+        return _Timer(self, (name, tuple(sorted(labels.items()))))
+
+    def observe(self, name, seconds, **labels):
+        if self.enabled:
+            self._observe((name, tuple(sorted(labels.items()))), seconds)
+
+    def increment(self, name, value=1, **labels):
+        if self.enabled:
+            self._count((name, tuple(sorted(labels.items()))), value)
+
+    def _observe(self, key, seconds):
+        with self._lock:
+            timer = self._timers.get(key)
+            if timer is None:
+                self._timers[key] = [1, seconds, seconds]
+            else:
+                timer[0] += 1
+                timer[1] += seconds
+                timer[2] = max(timer[2], seconds)
+
+    def _count(self, key, value):
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def reset(self):
+        with self._lock:
+            self._timers.clear()
+            self._counters.clear()
+
+    def snapshot(self):
+        """
+        Plain-data copy of every timer and counter
+        """
+        with self._lock:
+            timers = [
+                {"name": name, "labels": dict(labels), "count": count, "total_seconds": total, "max_seconds": longest}
+                for (name, labels), (count, total, longest) in sorted(self._timers.items())
+            ]
+            counters = [
+                {"name": name, "labels": dict(labels), "value": value}
+                for (name, labels), value in sorted(self._counters.items())
+            ]
+        return {"timers": timers, "counters": counters}
+
+    def write_json(self, path):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.snapshot(), f, indent=2, ensure_ascii=False)
+
+    def write_prometheus(self, path, prefix="tw_stock_crawler"):
+        """
+        Write the metrics in the Prometheus text exposition format (for the node_exporter textfile collector)
+        """
+        snapshot = self.snapshot()
+        families = {}  # metric -> (type, sample lines); samples of a family must be contiguous
+
+        def sample(metric, kind, line):
+            families.setdefault(metric, (kind, []))[1].append(line)
+
+        for timer in snapshot["timers"]:
+            labels = _prometheus_labels(timer["labels"])
+            metric = f"{prefix}_{timer['name']}_seconds"
+            sample(metric, "summary", f"{metric}_count{labels} {timer['count']}")
+            sample(metric, "summary", f"{metric}_sum{labels} {timer['total_seconds']:.6f}")
+            sample(f"{metric}_max", "gauge", f"{metric}_max{labels} {timer['max_seconds']:.6f}")
+        for counter in snapshot["counters"]:
+            metric = f"{prefix}_{counter['name']}_total"
+            sample(metric, "counter", f"{metric}{_prometheus_labels(counter['labels'])} {counter['value']}")
+        lines = []
+        for metric, (kind, samples) in families.items():
+            lines.append(f"# TYPE {metric} {kind}")
+            lines.extend(samples)
+        # Write then rename so the collector never reads a partial file
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write("\n".join(lines) + "\n")
+        os.replace(tmp_path, path)
+
+def _prometheus_labels(labels):
+    if not labels:
+        return ""
+    escaped = (f'{name}="{_escape_label(value)}"' for name, value in labels.items())
+    return "{" + ",".join(escaped) + "}"
+
+def _escape_label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+# Process-wide registry used by the crawler modules, disabled until an entry point enables it
+metrics = Metrics()
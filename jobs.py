@@ -0,0 +1,245 @@
+from contextlib import contextmanager
+from errors import CrawlError
+from instrumentation import metrics
+import json
+import logging
+import os
+import random
+import threading
+import time
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# Longest a cancelled job may sit in a breaker wait before it notices
+CANCEL_POLL = 0.5
+
+class JobCancelled(Exception):
+    """
+    The job was abandoned by whoever waited on it, e.g. after a timeout
+    """
+
+class JobControl:
+    """
+    Shared between a fetch job running in a worker thread and whoever waits on it.
+    The job marks each fetch attempt, so the waiter can time out attempts without
+    counting breaker pauses and backoff, and stops before its next wait or attempt
+    once the waiter cancels it.
+    """
+
+    def __init__(self):
+        self.cancelled = threading.Event()
+        self.attempt_started = None  # time.monotonic() of the running attempt, None between attempts
+        self.local = True  # False once the caller found the dataset in neither the cache nor the bulk quotes
+
+    def cancel(self):
+        self.cancelled.set()
+
+    def check(self):
+        if self.cancelled.is_set():
+            raise JobCancelled("The job was cancelled")
+
+    @contextmanager
+    def attempt(self):
+        self.attempt_started = time.monotonic()
+        try:
+            yield
+        finally:
+            self.attempt_started = None
+
+    def sleep(self, seconds):
+        """
+        Sleep, or raise JobCancelled as soon as the job is cancelled
+        """
+        if self.cancelled.wait(seconds):
+            self.check()
+
+class RetryPolicy:
+    """
+    Exponential backoff with full jitter: retry n waits a random time between
+    0 and min(cap, base * 2**n) seconds, so workers that failed together do
+    not all come back at the same moment.
+    """
+
+    def __init__(self, attempts=4, base=1.0, cap=60.0):
+        if attempts < 1:
+            raise ValueError("A job needs at least one attempt")
+        self.attempts = attempts
+        self.base = base
+        self.cap = cap
+
+    def delay(self, retry):
+        return random.uniform(0, min(self.cap, self.base * 2 ** retry))
+
+class CircuitBreaker:
+    """
+    Pause every job once `threshold` consecutive fetches fail in a way that
+    suggests the site is refusing us (blocked or timed out). After `cooldown`
+    seconds one trial job is let through: success closes the breaker, another
+    refusal opens it again for twice as long (up to max_cooldown).
+    """
+
+    def __init__(self, threshold=5, cooldown=60.0, max_cooldown=600.0):
+        self.threshold = threshold
+        self.base_cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self.cooldown = cooldown
+        self.state = 'closed'
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trial_started = 0.0
+        self._condition = threading.Condition()
+
+    def wait(self, job=None):
+        """
+        Block while the breaker is open, or while another job is running the trial fetch.
+        A trial that has not reported back within `cooldown` seconds is handed to the next
+        caller, so a dead or abandoned trial cannot stall the crawl. Raise JobCancelled
+        once the given JobControl is cancelled.
+        """
+        with self._condition:
+            while True:
+                if job is not None:
+                    job.check()
+                if self.state == 'closed':
+                    return
+                if self.state == 'open':
+                    remaining = self._opened_at + self.cooldown - time.monotonic()
+                    if remaining <= 0:
+                        self.state = 'half_open'
+                        self._trial_started = time.monotonic()
+                        logger.info("Circuit breaker half-open, sending a trial request")
+                        return  # This caller runs the trial
+                else:
+                    remaining = self._trial_started + self.cooldown - time.monotonic()
+                    if remaining <= 0:
+                        self._trial_started = time.monotonic()
+                        logger.warning("Trial request did not report back after %.0fs, sending another", self.cooldown)
+                        return
+                if job is not None:
+                    remaining = min(remaining, CANCEL_POLL)
+                self._condition.wait(remaining)
+
+    def record(self, error=None):
+        """
+        Record the outcome of a fetch. Success or an error the site answered (e.g. a page
+        without data) closes the breaker, an error with trips_breaker counts toward opening
+        it, and any other error leaves the count alone but does not pass a trial.
+        """
+        with self._condition:
+            if error is None or getattr(error, 'answered', False):
+                if self.state != 'closed':
+                    logger.info("Circuit breaker closed, resuming the crawl")
+                self.state = 'closed'
+                self.cooldown = self.base_cooldown
+                self._failures = 0
+            elif getattr(error, 'trips_breaker', False):
+                self._failures += 1
+                if self.state == 'half_open':
+                    self.cooldown = min(self.max_cooldown, self.cooldown * 2)
+                    self._open()
+                elif self.state == 'closed' and self._failures >= self.threshold:
+                    self._open()
+            elif self.state == 'half_open':
+                # The trial says nothing about the site, wait and try again
+                self._open()
+            self._condition.notify_all()
+
+    def _open(self):
+        self.state = 'open'
+        self._opened_at = time.monotonic()
+        metrics.increment('breaker_opened')
+        logger.warning("Circuit breaker open after %d refused requests, pausing the crawl for %.0fs",
+                       self._failures, self.cooldown)
+
+class Checkpoint:
+    """
+    Append-only JSON-lines log of the datasets and stocks a batch has finished,
+    so an interrupted run can resume where it stopped. Every finished dataset
+    is written with its rows, every fully crawled stock with its summary
+    record. A partly written last line (from a crash) is ignored on load.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.datasets = {}  # stock code -> {dataset: DataFrame}
+        self.records = {}   # stock code -> summary record
+        if os.path.exists(path):
+            self._load()
+            logger.info("Resuming from checkpoint %s: %d stocks done, %d in progress",
+                        path, len(self.records), len(self.datasets))
+
+    def _load(self):
+        with open(self.path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+                code = entry["stock"]
+                if "record" in entry:
+                    self.records[code] = entry["record"]
+                    self.datasets.pop(code, None)
+                else:
+                    self.datasets.setdefault(code, {})[entry["dataset"]] = pd.DataFrame(entry["rows"])
+
+    def dataset_done(self, stock_code, dataset, df):
+        self._append({"stock": stock_code, "dataset": dataset, "rows": df.to_dict(orient="list")})
+
+    def stock_done(self, stock_code, record):
+        self._append({"stock": stock_code, "record": record})
+
+    def remove(self):
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
+    def _append(self, entry):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(entry, ensure_ascii=False, default=str) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+class JobRunner:
+    """
+    Run one (crawler, dataset) fetch with retries, backoff and the shared circuit breaker.
+    The crawler must be strict so failures surface as CrawlErrors.
+    """
+
+    def __init__(self, retry=None, breaker=None):
+        self.retry = retry or RetryPolicy()
+        self.breaker = breaker or CircuitBreaker()
+
+    def run(self, crawler, dataset, job=None):
+        """
+        Fetch the dataset, retrying retryable CrawlErrors. With a JobControl each attempt
+        is marked on it, and a cancelled job stops before its next breaker wait, attempt
+        or backoff by raising JobCancelled.
+        """
+        job = job or JobControl()
+        retry = 0
+        while True:
+            self.breaker.wait(job)
+            try:
+                with job.attempt():
+                    df = crawler.fetch(dataset, local=job.local)
+            except CrawlError as e:
+                self.breaker.record(e)
+                if not e.retryable or retry + 1 >= self.retry.attempts:
+                    raise
+                delay = self.retry.delay(retry)
+                retry += 1
+                metrics.increment('retries', dataset=dataset, kind=e.kind)
+                logger.warning("%s (%s), retry %d of %d in %.1fs", e, e.kind, retry, self.retry.attempts - 1, delay)
+                job.sleep(delay)
+            except Exception as e:
+                # Unclassified errors are not retried, but must not leave a trial in flight
+                self.breaker.record(e)
+                raise
+            else:
+                self.breaker.record()
+                return df
@@ -1,133 +1,269 @@
-import os
+import argparse
+import logging
 import sys
+import threading
+from batch import load_watchlist, run_batch
+from bulk import BulkQuotes, TWSE_LISTING_URL, TWSE_QUOTES_URL
+from cache import ResultCache
 from crawler import StockCrawler
-from concurrent.futures import ThreadPoolExecutor
-from datetime import datetime
-from openpyxl import Workbook
-from utils import write_raw_data, style_summary_sheet
+from driver_pool import DriverPool
+from engine import AsyncCrawlEngine, HostRateLimiter
+from fetcher import HttpBackend
+from history_store import HistoryStore
+from instrumentation import metrics, setup_logging
+from jobs import Checkpoint, CircuitBreaker, JobRunner, RetryPolicy
+from parse_pool import ParsePool
+from report import write_screener
+from scheduler import RefreshScheduler
+from service import ValuationService, create_server
+from valuation import DEFAULT_STATS, load_history, parse_stats, screen, valuation_table
+from writers import FORMATS, pyarrow
+
+logger = logging.getLogger(__name__)
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Crawl Taiwan stock data from goodinfo.tw, e.g., python main.py 2330")
+    parser.add_argument("stock_codes", nargs="*", help="Stock codes without .TW, e.g., 2330 2317")
+    parser.add_argument("--watchlist", help="File with stock codes to crawl, one or more per line")
+    parser.add_argument("--workers", type=int, default=5, help="Maximum number of fetch jobs running at once across all stocks")
+    parser.add_argument("--pool-size", type=int, default=5, help="Number of browser drivers shared by the fetch jobs")
+    parser.add_argument("--lean", action="store_true",
+                        help="Headless browsers with eager page loads, no images/fonts/media/ads and memory-saving flags")
+    parser.add_argument("--parse-workers", type=int, default=0,
+                        help="Parse pages in this many worker processes instead of the fetch threads (0 parses in the fetch threads)")
+    parser.add_argument("--bulk", action="store_true",
+                        help="Take price and share number of listed stocks from the TWSE daily bulk files instead of one page per stock")
+    parser.add_argument("--bulk-quotes", help="URL or saved copy (JSON/CSV) of the daily quotes file, implies --bulk")
+    parser.add_argument("--bulk-listing", help="URL or saved copy (JSON/CSV) of the listed companies file, implies --bulk")
+    parser.add_argument("--engine", choices=["threads", "async"], default="threads",
+                        help="Run fetch jobs on a thread pool (no rate limit) or on the rate-limited asyncio engine")
+    parser.add_argument("--rate", type=float, default=1.0, help="Async engine: requests per second allowed per host")
+    parser.add_argument("--burst", type=int, default=2, help="Async engine: request burst allowed per host")
+    parser.add_argument("--job-timeout", type=float, default=180, help="Async engine: seconds a fetch attempt may take before its job is abandoned")
+    parser.add_argument("--backend", choices=["http", "selenium"], default="http",
+                        help="Fetch static pages over keep-alive HTTP (falling back to Selenium) or always use Selenium")
+    parser.add_argument("--base-url", help="Alternative site root, e.g. a local stub server serving saved pages")
+    parser.add_argument("--cache-dir", default=".crawler_cache", help="Directory of the on-disk result cache")
+    parser.add_argument("--cache-max-mb", type=int, default=200, help="Size limit of the result cache in MB")
+    parser.add_argument("--no-cache", action="store_true", help="Do not read or write the result cache")
+    parser.add_argument("--refresh", action="store_true", help="Ignore cached results and fetch everything again")
+    parser.add_argument("--store", help="SQLite file that accumulates the history of every fetched dataset")
+    parser.add_argument("--screen", action="store_true",
+                        help="Rank the stocks (all stocks in --store if none are given) by valuation from stored history, without crawling")
+    parser.add_argument("--profit-stats", type=parse_stats,
+                        help="Screener: profit margin scenarios of the price grid, min, mean, max and/or percentiles, "
+                             "e.g. 10,50,90 (default min,mean,max)")
+    parser.add_argument("--pe-stats", type=parse_stats,
+                        help="Screener: P/E scenarios of the price grid, min, mean, max and/or percentiles (default min,mean,max)")
+    parser.add_argument("--sort-by", default="Fair Upside %", help="Screener column to rank by")
+    parser.add_argument("--top", type=int, help="Only keep the top N stocks of the screener")
+    parser.add_argument("--retries", type=int, default=3,
+                        help="Retries of a failed fetch (timeout or blocked page), with exponential backoff and jitter")
+    parser.add_argument("--breaker-threshold", type=int, default=5,
+                        help="Consecutive refused requests that pause the whole crawl")
+    parser.add_argument("--breaker-cooldown", type=float, default=60, help="Seconds the crawl pauses once the site refuses requests")
+    parser.add_argument("--checkpoint", help="Checkpoint file; an interrupted run started again with it resumes the unfinished work")
+    parser.add_argument("--refresh-due", action="store_true",
+                        help="Only fetch the datasets republished since their last fetch (needs --store), then exit")
+    parser.add_argument("--schedule", action="store_true", help="Like --refresh-due, but keep running and refresh data as it becomes due")
+    parser.add_argument("--budget", type=int, help="Scheduler: maximum datasets fetched per run, most overdue first")
+    parser.add_argument("--schedule-interval", type=float, default=3600,
+                        help="Scheduler: maximum seconds between runs of --schedule")
+    parser.add_argument("--serve", action="store_true",
+                        help="Run as a service answering GET /valuation/<stock_code> with JSON; given stock codes are loaded at startup")
+    parser.add_argument("--host", default="127.0.0.1", help="Service mode: address to listen on")
+    parser.add_argument("--port", type=int, default=8080, help="Service mode: port to listen on")
+    parser.add_argument("--log-level", default="INFO", help="Logging level, e.g. DEBUG, INFO, WARNING")
+    parser.add_argument("--log-file", help="Also write the log to this file")
+    parser.add_argument("--metrics-json", help="Record per-stage timers and counters and write them to this JSON file")
+    parser.add_argument("--metrics-prom", help="Record per-stage timers and counters and write them as a Prometheus textfile")
+    parser.add_argument("--output-dir", default="output", help="Directory for the generated files")
+    parser.add_argument("--format", choices=FORMATS, default="xlsx",
+                        help="Output format: styled xlsx workbook, or csv/parquet/jsonl for machine consumers")
+    args = parser.parse_args()
+    # Workbooks, batch summaries and the service always use the min/mean/max grid
+    if (args.profit_stats or args.pe_stats) and not args.screen:
+        parser.error("--profit-stats and --pe-stats only apply to --screen")
+    # Fail before crawling rather than when the results are written
+    if args.format == "parquet" and pyarrow is None:
+        parser.error("--format parquet needs pyarrow, install it with: pip install pyarrow")
+    return args
+
+def run_screener(args, stock_codes):
+    """
+    Value the stocks from the history store with one vectorized pass and rank them
+    """
+    if not args.store:
+        logger.error("The screener needs stored history, e.g., python main.py --screen --store history.db")
+        return 1
+    store = HistoryStore(args.store)
+    try:
+        stock_codes = stock_codes or store.stock_codes()
+        if not stock_codes:
+            logger.error("No stock codes given and none in %s", args.store)
+            return 1
+        table = valuation_table(load_history(store, stock_codes), stock_codes,
+                                profit_stats=args.profit_stats or DEFAULT_STATS, pe_stats=args.pe_stats or DEFAULT_STATS)
+    finally:
+        store.close()
+    try:
+        ranked = screen(table, sort_by=args.sort_by, top=args.top)
+    except ValueError as e:
+        logger.error("%s", e)
+        return 1
+    print(ranked.round(2).to_string(index=False))
+    write_screener(ranked, output_dir=args.output_dir, fmt=args.format)
+    return 0
+
+def create_bulk(args):
+    if not (args.bulk or args.bulk_quotes or args.bulk_listing):
+        return None
+    return BulkQuotes(quotes=args.bulk_quotes or TWSE_QUOTES_URL, listing=args.bulk_listing or TWSE_LISTING_URL)
+
+class Components:
+    """
+    The crawl machinery shared by the batch, service and scheduler modes, built
+    from the same options so a new option reaches every mode, and closed together
+    """
+
+    def __init__(self, args, store=None):
+        # Share one bounded pool of drivers across all fetch jobs
+        self.pool = DriverPool(size=args.pool_size, headless=not StockCrawler.debug, lean=args.lean)
+        self.backend = HttpBackend(pool_size=args.workers) if args.backend == "http" else None
+        self.engine = None
+        if args.engine == "async":
+            self.engine = AsyncCrawlEngine(max_in_flight=args.workers,
+                                           rate_limiter=HostRateLimiter(args.rate, args.burst), timeout=args.job_timeout)
+        self.cache = None if args.no_cache else ResultCache(args.cache_dir, max_bytes=args.cache_max_mb * 1024 * 1024)
+        self.runner = JobRunner(RetryPolicy(attempts=args.retries + 1),
+                                CircuitBreaker(threshold=args.breaker_threshold, cooldown=args.breaker_cooldown))
+        self.parser = ParsePool(args.parse_workers) if args.parse_workers else None
+        self.bulk = create_bulk(args)
+        if store is None and args.store:
+            store = HistoryStore(args.store)
+        self.store = store
+
+    def close(self):
+        self.pool.shutdown()
+        if self.parser is not None:
+            self.parser.close()
+        if self.backend is not None:
+            self.backend.close()
+        if self.store is not None:
+            self.store.close()
+
+def run_crawl(args, stock_codes):
+    """
+    Crawl the stocks and write their outputs, return the process exit code
+    """
+    components = Components(args)
+    checkpoint = Checkpoint(args.checkpoint) if args.checkpoint else None
+    try:
+        records = run_batch(stock_codes, components.pool, max_workers=args.workers, output_dir=args.output_dir,
+                            backend=components.backend, base_url=args.base_url, cache=components.cache,
+                            refresh=args.refresh, engine=components.engine, store=components.store, fmt=args.format,
+                            runner=components.runner, checkpoint=checkpoint, parser=components.parser,
+                            bulk=components.bulk)
+    finally:
+        components.close()
+    
+    return 1 if all(record["Status"] == "failed" for record in records) else 0
+
+def run_service(args, stock_codes):
+    """
+    Serve valuations over HTTP from warm drivers and in-memory data until interrupted
+    """
+    components = Components(args)
+    service = ValuationService(components.pool, backend=components.backend, base_url=args.base_url,
+                               cache=components.cache, runner=components.runner, store=components.store,
+                               workers=args.workers, bulk=components.bulk, parser=components.parser)
+    server = create_server(service, args.host, args.port)
+
+    def warm_up():
+        components.pool.warm()
+        # Load the given stocks so their first requests are answered from memory
+        for code in stock_codes:
+            service.datasets(code)
+
+    threading.Thread(target=warm_up, name="warm-up", daemon=True).start()
+    logger.info("Serving valuations on http://%s:%d/valuation/<stock_code>", args.host, server.server_address[1])
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        logger.info("Shutting down")
+    finally:
+        server.server_close()
+        service.close()
+        components.close()
+    return 0
+
+def run_scheduler(args, stock_codes):
+    """
+    Refresh the due datasets of the stocks (all stocks in the store if none are given) once, or forever with --schedule
+    """
+    if not args.store:
+        logger.error("The scheduler needs a history store, e.g., python main.py --refresh-due --store history.db")
+        return 1
+    store = HistoryStore(args.store)
+    stock_codes = stock_codes or store.stock_codes()
+    if not stock_codes:
+        logger.error("No stock codes given and none in %s", args.store)
+        store.close()
+        return 1
+    components = Components(args, store=store)
+    scheduler = RefreshScheduler(store, stock_codes, components.pool, backend=components.backend,
+                                 base_url=args.base_url, cache=components.cache, runner=components.runner,
+                                 engine=components.engine, max_workers=args.workers, budget=args.budget,
+                                 parser=components.parser, bulk=components.bulk)
+    try:
+        if args.schedule:
+            scheduler.run_forever(interval=args.schedule_interval)
+        else:
+            refreshed, failed, remaining = scheduler.run_once()
+            logger.info("Refreshed %d datasets (%d failed, %d still due)", refreshed, failed, remaining)
+            return 1 if failed and not refreshed else 0
+    except KeyboardInterrupt:
+        logger.info("Shutting down")
+    finally:
+        components.close()
+    return 0
+
+def export_metrics(args):
+    if args.metrics_json:
+        metrics.write_json(args.metrics_json)
+        logger.info("Metrics saved to %s", args.metrics_json)
+    if args.metrics_prom:
+        metrics.write_prometheus(args.metrics_prom)
+        logger.info("Metrics saved to %s", args.metrics_prom)
 
 def main():
-    # Check command line arguments
-    if len(sys.argv) != 2:
-        print("Please provide a stock code, e.g., python main.py 2330")
+    args = parse_args()
+    setup_logging(args.log_level, args.log_file)
+    # Metrics cost next to nothing unless an export was requested
+    metrics.enabled = bool(args.metrics_json or args.metrics_prom)
+
+    stock_codes = list(args.stock_codes)
+    if args.watchlist:
+        stock_codes.extend(load_watchlist(args.watchlist))
+    stock_codes = list(dict.fromkeys(stock_codes))
+    if not stock_codes and not (args.screen or args.serve or args.refresh_due or args.schedule):
+        logger.error("Please provide a stock code, e.g., python main.py 2330")
         sys.exit(1)
-    
-    stock_code = sys.argv[1]
-    
-    # Use multi-threading to fetch data
-    with ThreadPoolExecutor(max_workers=5) as executor:
-        # Execute crawler tasks in parallel
-        revenue_data = executor.submit(StockCrawler(stock_code).get_revenue)
-        profit_ratio_data = executor.submit(StockCrawler(stock_code).get_profit_ratio)
-        pe_ratio_data = executor.submit(StockCrawler(stock_code).get_pe_ratio)
-        current_stock_price_data = executor.submit(StockCrawler(stock_code).get_current_stock_price)
-        share_number_data = executor.submit(StockCrawler(stock_code).get_share_number)
-        
-        # Wait for all tasks to complete and retrieve results
-        revenue = revenue_data.result()
-        profit_ratio = profit_ratio_data.result()
-        pe_ratio = pe_ratio_data.result()
-        current_stock_price = current_stock_price_data.result()
-        share_number = share_number_data.result()
-
-    # Create output directory if it doesn't exist
-    output_dir = "output"
-    if not os.path.exists(output_dir):
-        os.makedirs(output_dir)
-
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    output_file = f"{output_dir}/{stock_code}_stock_data_{timestamp}.xlsx"
-    wb = Workbook()
-    
-    # Remove default empty sheet
-    wb.remove(wb.active)
-    
-    # Write raw data to sheets
-    ws_revenue = wb.create_sheet("Revenue")
-    write_raw_data(ws_revenue, revenue)
-    
-    ws_profit = wb.create_sheet("Profit Margin")
-    write_raw_data(ws_profit, profit_ratio)
-    
-    ws_pe = wb.create_sheet("PE Ratio")
-    write_raw_data(ws_pe, pe_ratio)
-    
-    ws_price = wb.create_sheet("Current Price")
-    write_raw_data(ws_price, current_stock_price)
-    
-    ws_share = wb.create_sheet("Share")
-    write_raw_data(ws_share, share_number)
-    
-    # Create Summary sheet
-    ws_summary = wb.create_sheet("Summary", 0)  # Place it as the first sheet
-    
-    # Calculate required data
-    current_price = current_stock_price["Price"].iloc[0] if not current_stock_price.empty else None
-    share = share_number["Share"].iloc[0] if not share_number.empty else None
-    latest_pe = pe_ratio["P/E Ratio"].iloc[0] if not pe_ratio.empty else None
-    pe_min = pe_ratio["P/E Ratio"].min()
-    pe_avg = pe_ratio["P/E Ratio"].mean()
-    pe_max = pe_ratio["P/E Ratio"].max()
-    profit_min = profit_ratio["Net Profit Margin"].min()
-    profit_avg = profit_ratio["Net Profit Margin"].mean()
-    profit_max = profit_ratio["Net Profit Margin"].max()
-    
-    # Calculate the sum of the latest 12 months' revenue
-    if not revenue.empty and len(revenue) >= 12:
-        latest_12_months_revenue = revenue["Revenue"].tail(12).sum()
-    else:
-        latest_12_months_revenue = None
-        print("Warning: Insufficient revenue data for the last 12 months")
-    
-    # Write summary data
-    summary_data = [
-        ["Stock Code", stock_code],
-        ["Current Price", current_price],
-        ["Share Number", share],
-        ["Latest P/E Ratio", latest_pe],
-        ["", ""],  # Empty row
-        ["Past 180 Weeks P/E Ratio", ""],
-        ["Minimum", pe_min],
-        ["Average", pe_avg],
-        ["Maximum", pe_max],
-        ["", ""],  # Empty row
-        ["Past 5 Years Net Profit Margin", ""],
-        ["Minimum", profit_min],
-        ["Average", profit_avg],
-        ["Maximum", profit_max],
-        ["", ""],  # Empty row
-        ["Price Prediction (Latest 12 Months Revenue Sum * Profit Margin / " + str(share) + "/10 * P/E)", ""],
-    ]
-    
-    # Calculate 9 predicted prices using the new formula
-    if latest_12_months_revenue and all([pe_min, pe_avg, pe_max, profit_min, profit_avg, profit_max]):
-        profit_ratios = [profit_min, profit_avg, profit_max]
-        pe_ratios = [pe_min, pe_avg, pe_max]
-        price_predictions = []
-        for profit in profit_ratios:
-            for pe in pe_ratios:
-                # 除以10的部分是股本要換算回股數要除以10的票面價值
-                predicted_price = (latest_12_months_revenue * 10 * (profit/100) / (share/10)) * pe
-                price_predictions.append(predicted_price)
-        
-        prediction_labels = [
-            "Min Profit * Min PE", "Min Profit * Avg PE", "Min Profit * Max PE",
-            "Avg Profit * Min PE", "Avg Profit * Avg PE", "Avg Profit * Max PE",
-            "Max Profit * Min PE", "Max Profit * Avg PE", "Max Profit * Max PE"
-        ]
-        for label, price in zip(prediction_labels, price_predictions):
-            summary_data.append([label, f"{price:.2f}"])
-    
-    # Write data to Summary sheet
-    for row in summary_data:
-        ws_summary.append(row)
-    
-    # Apply styling to Summary sheet
-    style_summary_sheet(ws_summary)
-    
-    # Save the file
-    wb.save(output_file)
-    print(f"Data saved to {output_file}")
+
+    try:
+        with metrics.timer('run'):
+            if args.screen:
+                exit_code = run_screener(args, stock_codes)
+            elif args.serve:
+                exit_code = run_service(args, stock_codes)
+            elif args.refresh_due or args.schedule:
+                exit_code = run_scheduler(args, stock_codes)
+            else:
+                exit_code = run_crawl(args, stock_codes)
+    finally:
+        export_metrics(args)
+    if exit_code:
+        sys.exit(exit_code)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
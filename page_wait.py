@@ -0,0 +1,131 @@
+from collections import namedtuple
+from instrumentation import metrics
+from selenium.common.exceptions import WebDriverException
+from selenium.webdriver.common.by import By
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+AD_BUTTON = (By.ID, 'ats-interstitial-button')
+# Chrome's network error page, and goodinfo's notice shown to clients it throttles
+ERROR_PAGE = (By.XPATH, "//*[@id='main-frame-error'] | //body[contains(., '瀏覽量異常')]")
+
+# How a wait ended: 'ready' (content present), 'error' (error page) or 'timeout'
+WaitResult = namedtuple('WaitResult', ['path', 'elapsed', 'ads_dismissed'])
+
+class LatencyTracker:
+    """
+    Smoothed page latency and its deviation (the estimator TCP uses for its
+    retransmission timeout). The timeout is the smoothed latency plus four
+    deviations, clamped to [min_timeout, max_timeout].
+    """
+
+    def __init__(self, initial, min_timeout, max_timeout):
+        self.min_timeout = min_timeout
+        self.max_timeout = max_timeout
+        self.mean = None
+        self.deviation = None
+        self.initial = initial
+
+    def observe(self, seconds):
+        if self.mean is None:
+            self.mean, self.deviation = seconds, seconds / 2
+        else:
+            self.deviation = 0.75 * self.deviation + 0.25 * abs(seconds - self.mean)
+            self.mean = 0.875 * self.mean + 0.125 * seconds
+
+    def timeout(self):
+        if self.mean is None:
+            return self.initial
+        return min(self.max_timeout, max(self.min_timeout, self.mean + 4 * self.deviation))
+
+class PageWaiter:
+    """
+    Wait for a loaded page by racing three conditions on every poll: the
+    content is present, the ad interstitial is shown (dismiss it and keep
+    waiting) or an error page is shown. The deadline adapts to the latency
+    observed per page type, so fast pages never pay a fixed timeout.
+    At most max_dismissals clicks on the interstitial are made per wait, so
+    a button that stays on screen cannot keep the waiter busy.
+    """
+
+    def __init__(self, initial_timeout=20.0, min_timeout=5.0, max_timeout=30.0, poll=0.1, max_dismissals=3):
+        self.initial_timeout = initial_timeout
+        self.min_timeout = min_timeout
+        self.max_timeout = max_timeout
+        self.poll = poll
+        self.max_dismissals = max_dismissals
+        self._trackers = {}
+        self._lock = threading.Lock()
+
+    def timeout(self, page):
+        with self._lock:
+            return self._tracker(page).timeout()
+
+    def wait(self, driver, page, ready=(By.TAG_NAME, 'table')):
+        """
+        Block until `ready` is located, an error page shows or the adaptive timeout expires
+        """
+        timeout = self.timeout(page)
+        start = time.perf_counter()
+        deadline = start + timeout
+        ads_dismissed = 0
+        path = 'timeout'
+        while True:
+            if _present(driver, ready):
+                path = 'ready'
+                break
+            if _present(driver, ERROR_PAGE):
+                path = 'error'
+                break
+            # A dismissed ad may take a moment to go away, so the deadline and the poll still apply
+            if ads_dismissed < self.max_dismissals and self.dismiss_ad(driver, page):
+                ads_dismissed += 1
+            if time.perf_counter() >= deadline:
+                break
+            time.sleep(self.poll)
+        elapsed = time.perf_counter() - start
+        with self._lock:
+            # A timeout only tells us the page took at least this long
+            self._tracker(page).observe(elapsed)
+        metrics.observe('page_wait', elapsed, page=page, path=path)
+        logger.debug("Waited %.2fs for %s: %s (timeout %.1fs, %d ads dismissed)",
+                     elapsed, page, path, timeout, ads_dismissed)
+        return WaitResult(path, elapsed, ads_dismissed)
+
+    def dismiss_ad(self, driver, page=''):
+        """
+        Close the ad interstitial if it is shown, return True if it was
+        """
+        buttons = _find(driver, AD_BUTTON)
+        if not buttons:
+            return False
+        try:
+            if not (buttons[0].is_displayed() and buttons[0].is_enabled()):
+                return False
+            buttons[0].click()
+        except WebDriverException:
+            return False  # Not clickable yet, or removed while we looked at it
+        metrics.increment('ads_closed', page=page)
+        logger.info("Advertisement closed on %s", page)
+        return True
+
+    def _tracker(self, page):
+        tracker = self._trackers.get(page)
+        if tracker is None:
+            tracker = self._trackers[page] = LatencyTracker(self.initial_timeout, self.min_timeout, self.max_timeout)
+        return tracker
+
+def _find(driver, locator):
+    try:
+        return driver.find_elements(*locator)
+    except WebDriverException:
+        return []
+
+def _present(driver, locator):
+    return bool(_find(driver, locator))
+
+# Shared by all crawlers so every driver learns from the pages the others loaded
+default_waiter = PageWaiter()
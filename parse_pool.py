@@ -0,0 +1,49 @@
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from instrumentation import setup_logging
+from parsers import parse
+import logging
+import multiprocessing
+
+logger = logging.getLogger(__name__)
+
+class InlineParser:
+    """
+    Parse pages in the calling thread
+    """
+
+    def parse(self, dataset, html, stock_code=''):
+        return parse(dataset, html, stock_code)
+
+    def close(self):
+        pass
+
+class ParsePool(InlineParser):
+    """
+    Parse pages in worker processes so parsing neither holds the GIL nor
+    stalls the fetch threads. Only the raw HTML goes to a worker and only the
+    compact column arrays come back. The calling thread waits on the result
+    with the GIL released, so the other threads keep fetching meanwhile.
+    Falls back to parsing inline if the worker processes die.
+    """
+
+    def __init__(self, workers=None):
+        # Spawned workers never inherit the locks of the fetch threads, as forked ones could
+        self._executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'),
+                                             initializer=setup_logging, initargs=(logging.getLogger().level,))
+        self._broken = False
+
+    def parse(self, dataset, html, stock_code=''):
+        if not self._broken:
+            try:
+                return self._executor.submit(parse, dataset, html, stock_code).result()
+            except BrokenProcessPool:
+                self._broken = True
+                logger.warning("Parse workers died, parsing in the fetch threads from now on")
+        return super().parse(dataset, html, stock_code)
+
+    def close(self):
+        self._executor.shutdown(cancel_futures=True)
+
+# Shared by crawlers that are not given a parser
+inline_parser = InlineParser()
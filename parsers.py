@@ -0,0 +1,219 @@
+from datetime import datetime
+import logging
+import numpy as np
+import pandas as pd
+import re
+
+# lxml is much faster than BeautifulSoup's pure-Python html.parser; fall back to bs4 if it is missing
+try:
+    from lxml import html as lxml_html
+except ImportError:
+    lxml_html = None
+    from bs4 import BeautifulSoup
+
+logger = logging.getLogger(__name__)
+
+ROW_ID = re.compile(r'^row(\d+)$')
+
+def _collect_rows_lxml(html, table_id):
+    try:
+        doc = lxml_html.document_fromstring(html)
+    except ValueError:
+        # lxml refuses str input that carries an XML encoding declaration
+        doc = lxml_html.document_fromstring(html.encode('utf-8'))
+    if table_id is None:
+        scope = doc
+    else:
+        tables = doc.xpath('//table[@id=$table_id]', table_id=table_id)
+        if not tables:
+            return None
+        scope = tables[0]
+    rows = {}
+    for tr in scope.iter('tr'):
+        match = ROW_ID.match(tr.get('id') or '')
+        if match:
+            # Keep the first row with a given id, like find('tr', {'id': ...}) did
+            rows.setdefault(int(match.group(1)), [td.text_content().strip() for td in tr.iter('td')])
+    return rows
+
+def _collect_rows_bs4(html, table_id):
+    soup = BeautifulSoup(html, 'html.parser')
+    scope = soup if table_id is None else soup.find('table', {'id': table_id})
+    if scope is None:
+        return None
+    rows = {}
+    for tr in scope.find_all('tr', id=ROW_ID):
+        rows.setdefault(int(ROW_ID.match(tr['id']).group(1)), [td.text.strip() for td in tr.find_all('td')])
+    return rows
+
+def find_rows(html, table_id='tblDetail'):
+    """
+    Walk the table once and map each rowN id to the cell texts of that row.
+    Return None if the table is not found. table_id=None searches the whole page.
+    """
+    if lxml_html is not None:
+        return _collect_rows_lxml(html, table_id)
+    return _collect_rows_bs4(html, table_id)
+
+def extract_rows(html, table_id='tblDetail', limit=None, stock_code=''):
+    """
+    Return the cell texts of rows row0, row1, ... in order, stopping at the
+    first missing row id or after `limit` rows. Return None if the table is not found.
+    """
+    rows = find_rows(html, table_id)
+    if rows is None:
+        return None
+    ordered = []
+    i = 0
+    while limit is None or i < limit:
+        if i not in rows:
+            if limit is not None:
+                logger.info("Row %d not found for stock %s", i, stock_code)
+            break  # Stop if a row is missing
+        ordered.append(rows[i])
+        i += 1
+    return ordered
+
+def _to_float(text):
+    """
+    Convert a goodinfo cell to float, treating empty cells and '-' as missing
+    """
+    text = text.replace(',', '').replace('%', '')
+    if not text or text == '-':
+        return np.nan
+    try:
+        return float(text)
+    except ValueError:
+        return np.nan
+
+def to_frame(columns):
+    """
+    Build a DataFrame from typed column arrays
+    """
+    return pd.DataFrame(columns)
+
+def parse_revenue(html, stock_code=''):
+    """
+    Parse the last 36 months of revenue from ShowSaleMonChart.asp into column arrays
+    """
+    rows = extract_rows(html, limit=36, stock_code=stock_code)
+    if rows is None:
+        logger.warning("Revenue table 'tblDetail' not found for stock %s", stock_code)
+        return {}
+    years, months, revenues = [], [], []
+    for i, cols in enumerate(rows):
+        if len(cols) < 8:  # Ensure there are at least 8 <td> elements
+            continue
+        year_month = cols[0]  # First column is year/month
+        if not re.match(r'\d{4}/\d{2}', year_month):
+            logger.warning("Invalid year/month format in row%d: %s", i, year_month)
+            continue
+        year, month = map(int, year_month.split('/'))
+        years.append(year)
+        months.append(month)
+        revenues.append(_to_float(cols[7]))  # 8th column (index 7) is revenue
+    if not years:
+        return {}
+    return {
+        'Year': np.array(years, dtype=np.int64),
+        'Month': np.array(months, dtype=np.int64),
+        'Revenue': np.array(revenues, dtype=np.float64),
+    }
+
+def parse_profit_ratio(html, stock_code=''):
+    """
+    Parse the net profit margin of the past 5 years from StockBzPerformance.asp into column arrays
+    """
+    rows = extract_rows(html, limit=6, stock_code=stock_code)
+    if rows is None:
+        logger.warning("Profit table 'tblDetail' not found for stock %s", stock_code)
+        rows = []
+    years, margins = [], []
+    for i, cols in enumerate(rows):
+        if len(cols) < 16:  # Ensure there are at least 16 <td> elements
+            continue
+        year = cols[0]  # First column is year
+        if not re.match(r'\d{4}', year):
+            logger.warning("Invalid year format in row%d: %s", i, year)
+            continue
+        net_profit_margin = _to_float(cols[15])  # 16th column (index 15) is net profit margin 稅後淨利
+        # Skip if net profit margin is empty or invalid
+        if np.isnan(net_profit_margin):
+            logger.info("Skipping row%d (Year %s) due to empty or invalid profit margin", i, year)
+            continue
+        years.append(int(year))
+        margins.append(net_profit_margin)
+    if not years:
+        logger.warning("No valid profit data parsed for stock %s", stock_code)
+        return {}
+
+    # Ensure we have exactly 5 years of valid data
+    if len(years) > 5:
+        years, margins = years[-5:], margins[-5:]  # Take the latest 5 years
+    elif len(years) < 5:
+        logger.warning("Only %d years of valid profit data found for stock %s", len(years), stock_code)
+    return {
+        'Year': np.array(years, dtype=np.int64),
+        'Month': np.full(len(years), 12, dtype=np.int64),  # Annual data, default to December
+        'Net Profit Margin': np.array(margins, dtype=np.float64),
+    }
+
+def parse_pe_ratio(html, stock_code=''):
+    """
+    Parse the last 180 weeks of P/E ratio from ShowK_ChartFlow.asp into column arrays
+    """
+    rows = extract_rows(html, limit=180, stock_code=stock_code)
+    if rows is None:
+        logger.warning("PE ratio table 'tblDetail' not found for stock %s", stock_code)
+        return {}
+    years, weeks, pe_ratios = [], [], []
+    for i, cols in enumerate(rows):
+        if len(cols) < 6:  # Ensure there are at least 6 <td> elements
+            continue
+        week_str = cols[0]  # First column is week (e.g., "25W13")
+        if not re.match(r'\d{2}W\d{1,2}', week_str):
+            logger.warning("Invalid week format in row%d: %s", i, week_str)
+            continue
+        year, week = week_str.split('W')
+        years.append(2000 + int(year))
+        weeks.append(int(week))
+        pe_ratios.append(_to_float(cols[5]))  # 6th column (index 5) is P/E ratio
+    if not years:
+        return {}
+    return {
+        'Year': np.array(years, dtype=np.int64),
+        'Week': np.array(weeks, dtype=np.int64),
+        'P/E Ratio': np.array(pe_ratios, dtype=np.float64),
+    }
+
+def parse_share_number(html, stock_code=''):
+    """
+    Parse the latest share number from EquityDistributionClassHis.asp into column arrays
+    """
+    share = np.nan
+    # The latest figure is in row1 of the page
+    cols = (find_rows(html, table_id=None) or {}).get(1)
+    if cols and len(cols) > 5:
+        share = _to_float(cols[5])
+    else:
+        logger.error("Error finding Share element for %s", stock_code)
+    current_date = datetime.now()
+    return {
+        'Year': np.array([current_date.year], dtype=np.int64),
+        'Month': np.array([current_date.month], dtype=np.int64),
+        'Share': np.array([share], dtype=np.float64),
+    }
+
+# Dataset key -> parser of its page
+PARSERS = {
+    'revenue': parse_revenue,
+    'profit': parse_profit_ratio,
+    'pe': parse_pe_ratio,
+    'share': parse_share_number,
+}
+
+def parse(dataset, html, stock_code=''):
+    """
+    Parse the page of a dataset into column arrays (module-level so parse workers can unpickle it)
+    """
+    return PARSERS[dataset](html, stock_code)
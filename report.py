@@ -0,0 +1,157 @@
+import logging
+import os
+import numpy as np
+import pandas as pd
+from datetime import datetime
+from instrumentation import metrics
+from valuation import grid_labels, price_grid, reduce_stats
+from writers import write_output
+
+logger = logging.getLogger(__name__)
+
+# Dataset key -> sheet name of the per-stock workbook
+SHEETS = [
+    ("revenue", "Revenue"),
+    ("profit", "Profit Margin"),
+    ("pe", "PE Ratio"),
+    ("price", "Current Price"),
+    ("share", "Share"),
+]
+
+PREDICTION_LABELS = grid_labels()
+
+def _column(df, name):
+    """
+    Return a column of the DataFrame, or an empty Series if the fetch produced nothing
+    """
+    if df is None or name not in df:
+        return pd.Series(dtype=float)
+    return df[name]
+
+def _first(df, name):
+    column = _column(df, name)
+    return column.iloc[0] if not column.empty else None
+
+def summarize(stock_code, data):
+    """
+    Calculate the summary figures and price predictions of one stock
+    """
+    revenue = data.get("revenue")
+    pe_ratio = _column(data.get("pe"), "P/E Ratio").to_numpy(dtype=float)
+    profit_ratio = _column(data.get("profit"), "Net Profit Margin").to_numpy(dtype=float)
+    pe_min, pe_avg, pe_max = reduce_stats(pe_ratio[None, :])[0]
+    profit_min, profit_avg, profit_max = reduce_stats(profit_ratio[None, :])[0]
+
+    summary = {
+        "Stock Code": stock_code,
+        "Current Price": _first(data.get("price"), "Price"),
+        "Share Number": _first(data.get("share"), "Share"),
+        "Latest P/E Ratio": _first(data.get("pe"), "P/E Ratio"),
+        "PE Min": pe_min,
+        "PE Avg": pe_avg,
+        "PE Max": pe_max,
+        "Profit Min": profit_min,
+        "Profit Avg": profit_avg,
+        "Profit Max": profit_max,
+    }
+
+    # Calculate the sum of the latest 12 months' revenue
+    revenue_values = _column(revenue, "Revenue")
+    if len(revenue_values) >= 12:
+        summary["Latest 12 Months Revenue"] = revenue_values.tail(12).sum()
+    else:
+        summary["Latest 12 Months Revenue"] = None
+        logger.warning("Insufficient revenue data for the last 12 months of stock %s", stock_code)
+
+    # Calculate 9 predicted prices using the new formula
+    predictions = []
+    latest_12_months_revenue = summary["Latest 12 Months Revenue"]
+    share = summary["Share Number"]
+    pe_stats = [pe_min, pe_avg, pe_max]
+    profit_stats = [profit_min, profit_avg, profit_max]
+    # Parsed frames mark missing numbers as NaN, and a stock without P/E or profit history reduces to NaN stats
+    if pd.notna(latest_12_months_revenue) and latest_12_months_revenue and pd.notna(share) and share \
+            and np.isfinite(pe_stats + profit_stats).all() and all(pe_stats + profit_stats):
+        grid = price_grid([latest_12_months_revenue], [share], [profit_stats], [pe_stats])
+        predictions = grid[0].ravel().tolist()
+    summary["Predictions"] = list(zip(PREDICTION_LABELS, predictions))
+    return summary
+
+def build_summary_rows(summary):
+    """
+    Lay out the summary figures as rows of the Summary sheet
+    """
+    summary_data = [
+        ["Stock Code", summary["Stock Code"]],
+        ["Current Price", summary["Current Price"]],
+        ["Share Number", summary["Share Number"]],
+        ["Latest P/E Ratio", summary["Latest P/E Ratio"]],
+        ["", ""],  # Empty row
+        ["Past 180 Weeks P/E Ratio", ""],
+        ["Minimum", summary["PE Min"]],
+        ["Average", summary["PE Avg"]],
+        ["Maximum", summary["PE Max"]],
+        ["", ""],  # Empty row
+        ["Past 5 Years Net Profit Margin", ""],
+        ["Minimum", summary["Profit Min"]],
+        ["Average", summary["Profit Avg"]],
+        ["Maximum", summary["Profit Max"]],
+        ["", ""],  # Empty row
+        ["Price Prediction (Latest 12 Months Revenue Sum * Profit Margin / " + str(summary["Share Number"]) + "/10 * P/E)", ""],
+    ]
+    for label, price in summary["Predictions"]:
+        summary_data.append([label, f"{price:.2f}"])
+    return summary_data
+
+def _ensure_output_dir(output_dir):
+    # Create output directory if it doesn't exist
+    if not os.path.exists(output_dir):
+        os.makedirs(output_dir)
+
+def write_stock_output(stock_code, data, output_dir="output", fmt="xlsx"):
+    """
+    Write the raw data and the summary of one stock, return (path, summary).
+    xlsx gets the styled Summary sheet; the machine formats get the flat summary record.
+    """
+    _ensure_output_dir(output_dir)
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    base_path = f"{output_dir}/{stock_code}_stock_data_{timestamp}"
+    summary = summarize(stock_code, data)
+    sheets = [(sheet_name, data.get(dataset, pd.DataFrame())) for dataset, sheet_name in SHEETS]
+    with metrics.timer('write', stock=stock_code, format=fmt):
+        if fmt == "xlsx":
+            output_file = write_output(base_path, sheets, fmt, summary_rows=build_summary_rows(summary))
+        else:
+            sheets.insert(0, ("Summary", pd.DataFrame([summary_record(summary)])))
+            output_file = write_output(base_path, sheets, fmt)
+    logger.info("Data saved to %s", output_file)
+    return output_file, summary
+
+def summary_record(summary):
+    """
+    Flatten a stock summary into one row of the combined batch summary table
+    """
+    record = {key: value for key, value in summary.items() if key != "Predictions"}
+    for label, price in summary["Predictions"]:
+        record[label] = round(price, 2)
+    return record
+
+def write_batch_summary(records, output_dir="output", fmt="xlsx"):
+    """
+    Write one row per stock (including failed ones) into a combined summary table
+    """
+    _ensure_output_dir(output_dir)
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    output_file = write_output(f"{output_dir}/batch_summary_{timestamp}", [("Summary", pd.DataFrame(records))], fmt)
+    logger.info("Batch summary saved to %s", output_file)
+    return output_file
+
+def write_screener(table, output_dir="output", fmt="xlsx"):
+    """
+    Write a ranked valuation table
+    """
+    _ensure_output_dir(output_dir)
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    output_file = write_output(f"{output_dir}/screener_{timestamp}", [("Screener", table.round(2))], fmt)
+    logger.info("Screener saved to %s", output_file)
+    return output_file
@@ -0,0 +1,157 @@
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from crawler import StockCrawler
+from datetime import datetime, timedelta
+from instrumentation import metrics
+from jobs import JobRunner
+from utils import is_empty_frame
+import heapq
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+# Taiwan financial statements: annual report by Mar 31, Q1 by May 15, Q2 by Aug 14, Q3 by Nov 14
+PROFIT_RELEASES = [(4, 1), (5, 16), (8, 15), (11, 15)]
+MARKET_CLOSE = (13, 30)
+
+def _next_monthly(last, day):
+    due = last.replace(day=day, hour=0, minute=0, second=0, microsecond=0)
+    if due <= last:
+        due = due.replace(year=due.year + due.month // 12, month=due.month % 12 + 1)
+    return due
+
+def _next_weekly(last, weekday):
+    due = (last + timedelta(days=(weekday - last.weekday()) % 7)).replace(hour=0, minute=0, second=0, microsecond=0)
+    return due if due > last else due + timedelta(days=7)
+
+def _next_release(last):
+    for year in (last.year, last.year + 1):
+        for month, day in PROFIT_RELEASES:
+            due = datetime(year, month, day)
+            if due > last:
+                return due
+
+def _next_market_close(last):
+    due = last.replace(hour=MARKET_CLOSE[0], minute=MARKET_CLOSE[1], second=0, microsecond=0)
+    if due <= last:
+        due += timedelta(days=1)
+    while due.weekday() >= 5:  # No trading on weekends
+        due += timedelta(days=1)
+    return due
+
+# Dataset key -> when data newer than a fetch at `last` is published (local time)
+CADENCES = {
+    'revenue': lambda last: _next_monthly(last, 11),   # Monthly revenue is published by the 10th
+    'profit': _next_release,                           # Quarterly statements
+    'pe': lambda last: _next_weekly(last, 5),          # Weekly P/E, complete after Friday's session
+    'price': _next_market_close,                       # Closing price of each trading day
+    'share': lambda last: _next_monthly(last, 1),      # Share capital rarely changes, check monthly
+}
+
+def next_due(dataset, last_fetched):
+    """
+    When a dataset last fetched at `last_fetched` (None if never) is due for a refresh
+    """
+    if last_fetched is None:
+        return datetime.min
+    return CADENCES[dataset](last_fetched)
+
+class RefreshScheduler:
+    """
+    Refresh only the (stock, dataset) pairs whose data has been republished
+    since their last fetch, according to each dataset's publication cadence.
+    Stale pairs are queued by how long they have been due (never fetched
+    first) and at most `budget` of them are fetched per run. Fetches are
+    logged in the HistoryStore, which also receives the rows.
+    """
+
+    def __init__(self, store, stock_codes, pool, backend=None, base_url=None, cache=None, runner=None,
+                 engine=None, max_workers=5, budget=None, parser=None, bulk=None):
+        self.store = store
+        self.stock_codes = list(stock_codes)
+        self.runner = runner or JobRunner()
+        self.engine = engine
+        self.max_workers = max_workers
+        self.budget = budget
+        # Due data is never served from the cache, but fresh results still refresh it
+        self.crawlers = {code: StockCrawler(code, pool=pool, backend=backend, base_url=base_url, cache=cache, refresh=True,
+                                            strict=True, parser=parser, bulk=bulk) for code in self.stock_codes}
+
+    def queue(self, now=None):
+        """
+        Heap of (due time, stock code, dataset) for every pair due at `now`
+        """
+        now = now or datetime.now()
+        last = self.store.last_fetched(self.stock_codes)
+        heap = []
+        for code in self.stock_codes:
+            for dataset in StockCrawler.DATASETS:
+                due = next_due(dataset, last.get((code, dataset)))
+                if due <= now:
+                    heap.append((due, code, dataset))
+        heapq.heapify(heap)
+        return heap
+
+    def next_wake(self):
+        """
+        Earliest time any pair becomes due
+        """
+        last = self.store.last_fetched(self.stock_codes)
+        return min(next_due(dataset, last.get((code, dataset)))
+                   for code in self.stock_codes for dataset in StockCrawler.DATASETS)
+
+    def run_once(self, now=None):
+        """
+        Fetch the most overdue pairs within the budget, return (refreshed, failed, still due)
+        """
+        heap = self.queue(now)
+        count = len(heap) if self.budget is None else min(self.budget, len(heap))
+        selected = [heapq.heappop(heap) for _ in range(count)]
+        logger.info("%d of %d due datasets selected for refresh", len(selected), len(selected) + len(heap))
+        refreshed, failed = 0, 0
+
+        def collect(code, dataset, result, error):
+            nonlocal refreshed, failed
+            if error is not None or is_empty_frame(result):
+                failed += 1
+                logger.error("Error refreshing %s for stock %s: %s", dataset, code, error)
+                return
+            added = self.store.append(code, dataset, result)
+            self.store.record_fetch(code, dataset, self.crawlers[code].fetched_at.get(dataset))
+            refreshed += 1
+            metrics.increment('rows_stored', added, dataset=dataset)
+            logger.info("Refreshed %s for stock %s: %d new rows", dataset, code, added)
+
+        jobs = [(self.crawlers[code], dataset) for _, code, dataset in selected]
+        if self.engine is not None:
+            self.engine.run_sync(jobs, on_result=collect, fetch=self.runner.run)
+        else:
+            with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                futures = {executor.submit(self.runner.run, crawler, dataset): (crawler.raw_stock_code, dataset)
+                           for crawler, dataset in jobs}
+                for future in as_completed(futures):
+                    code, dataset = futures[future]
+                    try:
+                        result, error = future.result(), None
+                    except Exception as e:
+                        result, error = None, e
+                    collect(code, dataset, result, error)
+        metrics.increment('scheduled_refreshes', refreshed, status='ok')
+        metrics.increment('scheduled_refreshes', failed, status='failed')
+        return refreshed, failed, len(heap)
+
+    def run_forever(self, interval=3600):
+        """
+        Refresh what is due, then sleep until the next pair is due (or at most `interval` seconds), forever
+        """
+        while True:
+            refreshed, failed, remaining = self.run_once()
+            if remaining or failed:
+                # Work was left behind by the budget or by failures, try again after the interval
+                wake = datetime.now() + timedelta(seconds=interval)
+            else:
+                wake = min(self.next_wake(), datetime.now() + timedelta(seconds=interval))
+            delay = max(1.0, (wake - datetime.now()).total_seconds())
+            logger.info("Refreshed %d datasets (%d failed, %d still due), next run in %.0fs",
+                        refreshed, failed, remaining, delay)
+            time.sleep(delay)
@@ -0,0 +1,218 @@
+from cache import DATASET_TTLS
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from crawler import StockCrawler
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from instrumentation import metrics
+from jobs import JobRunner
+from report import summarize, summary_record
+from utils import is_empty_frame
+import json
+import logging
+import math
+import re
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+STOCK_CODE = re.compile(r'^[0-9A-Za-z]{1,10}$')
+
+class SingleFlight:
+    """
+    Merge concurrent calls for the same key into one: the first caller runs
+    the function, the others wait for it and share its result or exception.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}  # key -> [done event, result, exception]
+
+    def do(self, key, fn):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = [threading.Event(), None, None]
+        if not leader:
+            metrics.increment('coalesced_requests')
+            call[0].wait()
+        else:
+            try:
+                call[1] = fn()
+            except Exception as e:
+                call[2] = e
+            finally:
+                with self._lock:
+                    del self._calls[key]
+                call[0].set()
+        if call[2] is not None:
+            raise call[2]
+        return call[1]
+
+class ValuationService:
+    """
+    Long-lived crawl state for the HTTP API: one warm crawler per stock
+    sharing the driver pool, HTTP backend and result cache, an in-memory copy
+    of every fresh dataset (same TTLs as the result cache) and single-flight
+    fetches so concurrent requests never crawl the same page twice.
+    Expired datasets are dropped from memory and at most max_crawlers
+    crawlers are kept, least recently used first out.
+    """
+
+    def __init__(self, pool, backend=None, base_url=None, cache=None, runner=None, store=None, ttls=None, workers=5,
+                 bulk=None, max_crawlers=1000, parser=None):
+        self.pool = pool
+        self.backend = backend
+        self.base_url = base_url
+        self.cache = cache
+        self.runner = runner or JobRunner()
+        self.store = store
+        self.bulk = bulk
+        self.parser = parser
+        self.ttls = dict(DATASET_TTLS, **(ttls or {}))
+        self.max_crawlers = max_crawlers
+        self._crawlers = OrderedDict()
+        self._memory = {}  # (stock code, dataset) -> (fetched at, DataFrame)
+        self._lock = threading.Lock()
+        self._flight = SingleFlight()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='service')
+
+    def crawler(self, stock_code):
+        with self._lock:
+            crawler = self._crawlers.get(stock_code)
+            if crawler is None:
+                crawler = self._crawlers[stock_code] = StockCrawler(
+                    stock_code, pool=self.pool, backend=self.backend, base_url=self.base_url, cache=self.cache, strict=True,
+                    parser=self.parser, bulk=self.bulk)
+                while len(self._crawlers) > self.max_crawlers:
+                    self._crawlers.popitem(last=False)
+            else:
+                self._crawlers.move_to_end(stock_code)
+            return crawler
+
+    def dataset(self, stock_code, dataset):
+        """
+        Return one dataset of a stock from memory while it is fresh, otherwise fetch it (once for all concurrent callers)
+        """
+        key = (stock_code, dataset)
+        with self._lock:
+            entry = self._memory.get(key)
+        if entry is not None and self._fresh(dataset, entry[0]):
+            metrics.increment('memory_hits', dataset=dataset)
+            return entry[1]
+        return self._flight.do(key, lambda: self._fetch(stock_code, dataset))
+
+    def _fresh(self, dataset, fetched_at, now=None):
+        return (now or datetime.now()) - fetched_at <= self.ttls.get(dataset, timedelta(0))
+
+    def _fetch(self, stock_code, dataset):
+        crawler = self.crawler(stock_code)
+        df = self.runner.run(crawler, dataset)
+        if not is_empty_frame(df):
+            # Data served from the disk cache is only fresh for what is left of its TTL
+            fetched_at = crawler.fetched_at.get(dataset) or datetime.now()
+            now = datetime.now()
+            with self._lock:
+                self._memory = {key: entry for key, entry in self._memory.items() if self._fresh(key[1], entry[0], now)}
+                self._memory[(stock_code, dataset)] = (fetched_at, df)
+            if self.store is not None:
+                self.store.append(stock_code, dataset, df)
+                self.store.record_fetch(stock_code, dataset, fetched_at)
+        return df
+
+    def datasets(self, stock_code):
+        """
+        Fetch every dataset of a stock in parallel, return ({dataset: DataFrame}, {dataset: error})
+        """
+        futures = {dataset: self._executor.submit(self.dataset, stock_code, dataset) for dataset in StockCrawler.DATASETS}
+        data, errors = {}, {}
+        for dataset, future in futures.items():
+            try:
+                data[dataset] = future.result()
+            except Exception as e:
+                errors[dataset] = e
+        return data, errors
+
+    def valuation(self, stock_code):
+        """
+        Summary figures and price predictions of a stock as a JSON-ready dict
+        """
+        data, errors = self.datasets(stock_code)
+        if not data:
+            return None, errors
+        summary = summary_record(summarize(stock_code, data))
+        summary["Errors"] = {dataset: str(e) for dataset, e in errors.items()}
+        return summary, errors
+
+    def close(self):
+        self._executor.shutdown(wait=False)
+
+def _json_value(value):
+    # NaN is not valid JSON, numpy scalars are not JSON serializable
+    if hasattr(value, 'item'):
+        value = value.item()
+    if isinstance(value, float) and math.isnan(value):
+        return None
+    return value
+
+def _json_frame(df):
+    return [{name: _json_value(value) for name, value in row.items()} for row in df.to_dict(orient='records')]
+
+class ServiceHandler(BaseHTTPRequestHandler):
+    """
+    GET /valuation/<code>          summary figures and price predictions
+    GET /dataset/<code>/<dataset>  rows of one dataset
+    GET /health                    liveness check
+    """
+    service = None  # Set on the subclass built by create_server()
+
+    def do_GET(self):
+        start = time.perf_counter()
+        parts = [part for part in self.path.split('?', 1)[0].split('/') if part]
+        route = parts[0] if parts else ''
+        try:
+            if parts == ['health']:
+                self._send(200, {"status": "ok"})
+            elif route == 'valuation' and len(parts) == 2 and STOCK_CODE.match(parts[1]):
+                summary, errors = self.service.valuation(parts[1])
+                if summary is None:
+                    self._send(502, {"error": f"No data could be fetched for stock {parts[1]}",
+                                     "errors": {dataset: str(e) for dataset, e in errors.items()}})
+                else:
+                    self._send(200, {key: _json_value(value) for key, value in summary.items()})
+            elif route == 'dataset' and len(parts) == 3 and STOCK_CODE.match(parts[1]) \
+                    and parts[2] in StockCrawler.DATASETS:
+                try:
+                    df = self.service.dataset(parts[1], parts[2])
+                except Exception as e:
+                    self._send(502, {"error": str(e)})
+                else:
+                    self._send(200, {"stock": parts[1], "dataset": parts[2], "rows": _json_frame(df)})
+            else:
+                self._send(404, {"error": f"Unknown path {self.path}"})
+        except Exception as e:
+            logger.exception("Error serving %s", self.path)
+            self._send(500, {"error": str(e)})
+        metrics.observe('request', time.perf_counter() - start, route=route)
+
+    def _send(self, status, payload):
+        body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        logger.info("%s %s", self.address_string(), format % args)
+
+def create_server(service, host='127.0.0.1', port=8080):
+    """
+    Build a threading HTTP server answering with the given ValuationService
+    """
+    handler = type('BoundServiceHandler', (ServiceHandler,), {'service': service})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
@@ -0,0 +1,27 @@
+"""
+Stand-ins shared by the test suites.
+"""
+import threading
+import time
+
+import pandas as pd
+
+class FakeRunner:
+    """
+    Stands in for JobRunner: records the jobs and returns a one-row frame after
+    `delay` seconds, marked as downloaded at `fetched_at` if one is given
+    """
+
+    def __init__(self, fetched_at=None, delay=0.0):
+        self.fetched_at = fetched_at
+        self.delay = delay
+        self.jobs = []
+        self._lock = threading.Lock()
+
+    def run(self, crawler, dataset, job=None):
+        with self._lock:
+            self.jobs.append((crawler.raw_stock_code, dataset))
+        time.sleep(self.delay)
+        if self.fetched_at is not None:
+            crawler.fetched_at[dataset] = self.fetched_at
+        return pd.DataFrame({'Year': [2025], 'Month': [6], 'Value': [1.0]})
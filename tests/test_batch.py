@@ -0,0 +1,15 @@
+"""
+Watchlist files: codes split on commas or whitespace, comments, duplicates
+and the BOM Windows editors write.
+"""
+from batch import load_watchlist
+
+def test_watchlist_codes_comments_and_duplicates(tmp_path):
+    path = tmp_path / "watchlist.txt"
+    path.write_text("2330, 2317  # foundry and assembly\n# holdings\n2454\t2330\n\n", encoding="utf-8")
+    assert load_watchlist(str(path)) == ['2330', '2317', '2454']
+
+def test_watchlist_saved_with_a_bom(tmp_path):
+    path = tmp_path / "watchlist.txt"
+    path.write_text("2330\r\n2317\r\n", encoding="utf-8-sig")
+    assert load_watchlist(str(path)) == ['2330', '2317']
@@ -0,0 +1,62 @@
+"""
+BulkQuotes reads the TWSE quotes and listing files: ROC dates become
+Gregorian, paid-in capital becomes the share number in 1e8 NTD, and
+stocks missing from the files fall back to their pages.
+"""
+import json
+from datetime import datetime
+
+import pandas as pd
+import pytest
+
+from bulk import BulkQuotes, _quote_date
+from crawler import StockCrawler
+
+QUOTES = [
+    {"Date": "1140613", "Code": "2330", "Name": "台積電", "ClosingPrice": "1,025.00"},
+    {"Date": "1140613", "Code": "2317", "Name": "鴻海", "ClosingPrice": ""},
+]
+LISTING = "出表日期,公司代號,公司名稱,實收資本額\n1140615,2330,台積電,\"259,325,245,210\"\n1140615,2317,鴻海,138627945250\n"
+
+@pytest.fixture
+def bulk(tmp_path):
+    quotes = tmp_path / "STOCK_DAY_ALL.json"
+    quotes.write_text(json.dumps(QUOTES, ensure_ascii=False), encoding="utf-8")
+    listing = tmp_path / "t187ap03_L.csv"
+    listing.write_text(LISTING, encoding="utf-8")
+    return BulkQuotes(quotes=str(quotes), listing=str(listing))
+
+@pytest.mark.parametrize("text, date", [
+    ("1140613", datetime(2025, 6, 13)),
+    ("0991231", datetime(2010, 12, 31)),
+    ("20250613", datetime(2025, 6, 13)),
+    ("1141332", None),
+    ("", None),
+])
+def test_quote_date(text, date):
+    assert _quote_date(text) == date
+
+def test_price_takes_the_quote_date(bulk):
+    df = bulk.frame('2330', 'price')
+    assert df.to_dict(orient='records') == [{'Year': 2025, 'Month': 6, 'Price': 1025.0}]
+
+def test_share_is_paid_in_capital_in_units_of_1e8(bulk):
+    assert bulk.frame('2330', 'share')['Share'].iloc[0] == pytest.approx(2593.2524521)
+    assert bulk.frame('2317', 'share')['Share'].iloc[0] == pytest.approx(1386.2794525)
+
+def test_missing_stock_or_value_is_none(bulk):
+    assert bulk.frame('2317', 'price') is None  # No trade, no closing price
+    assert bulk.frame('6488', 'price') is None  # OTC stocks are not in the files
+    assert bulk.frame('6488', 'share') is None
+
+def test_crawler_falls_back_to_the_page(bulk):
+    page = pd.DataFrame([{'Year': 2025, 'Month': 6, 'Price': 500.0}])
+    for code, expected in (('2330', 1025.0), ('6488', 500.0)):
+        crawler = StockCrawler(code, pool=object(), bulk=bulk)
+        crawler.get_current_stock_price = lambda: page
+        assert crawler.fetch('price')['Price'].iloc[0] == expected
+
+def test_unreadable_source_leaves_its_column_empty(tmp_path, bulk):
+    bulk.listing = str(tmp_path / "missing.json")
+    assert bulk.frame('2330', 'price')['Price'].iloc[0] == 1025.0
+    assert bulk.frame('2330', 'share') is None
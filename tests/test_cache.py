@@ -0,0 +1,69 @@
+"""
+ResultCache expires entries per dataset, evicts the least recently used
+ones down to its low-water mark and keeps its running size in step with
+the directory. StockCrawler skips it on --refresh.
+"""
+import os
+import time
+from datetime import timedelta
+
+import pandas as pd
+import pytest
+
+from cache import ResultCache
+from crawler import StockCrawler
+
+def frame(rows=10):
+    return pd.DataFrame({'Year': [2025] * rows, 'Month': range(rows), 'Value': [1.5] * rows})
+
+@pytest.fixture
+def cache(tmp_path):
+    return ResultCache(str(tmp_path / "cache"))
+
+def on_disk(cache):
+    return cache._scan()[1]
+
+def test_entries_expire_after_their_dataset_ttl(tmp_path):
+    cache = ResultCache(str(tmp_path / "cache"), ttls={'price': timedelta(seconds=0.05)})
+    cache.put('2330', 'price', frame())
+    cache.put('2330', 'revenue', frame())
+    assert cache.get('2330', 'price') is not None
+    time.sleep(0.1)
+    assert cache.get('2330', 'price') is None
+    assert cache.get('2330', 'revenue') is not None
+
+def test_least_recently_used_entries_are_evicted_to_the_low_water_mark(tmp_path):
+    probe = ResultCache(str(tmp_path / "probe"))
+    probe.put('0', 'pe', frame())
+    size = on_disk(probe)
+    cache = ResultCache(str(tmp_path / "cache"), max_bytes=int(size * 4.5), low_water=0.5)
+    for i, code in enumerate(['1', '2', '3', '4']):
+        cache.put(code, 'pe', frame())
+        os.utime(cache._path(code, 'pe'), (1000 + i, 1000 + i))
+    assert cache.get('1', 'pe') is not None  # Reading an entry makes it the most recently used
+    cache.put('5', 'pe', frame())
+    # Five entries crossed the limit, so only what fits in half of it is kept
+    assert [code for code in '12345' if cache.get(code, 'pe') is not None] == ['1', '5']
+    assert cache._size == on_disk(cache) <= cache.max_bytes * cache.low_water
+
+def test_refresh_skips_the_cache_but_stores_the_new_result(cache):
+    cache.put('2330', 'pe', frame(rows=1))
+    assert len(StockCrawler('2330', pool=object(), cache=cache).from_cache('pe')) == 1
+    crawler = StockCrawler('2330', pool=object(), cache=cache, refresh=True)
+    assert crawler.from_cache('pe') is None
+    crawler.get_pe_ratio = lambda: frame(rows=3)
+    assert len(crawler.fetch('pe')) == 3
+    assert len(cache.get('2330', 'pe')) == 3
+
+def test_size_follows_replaced_and_discarded_entries(cache):
+    cache.put('2330', 'pe', frame())
+    cache.put('2317', 'pe', frame())
+    cache.put('2330', 'pe', frame(rows=200))
+    assert cache._size == on_disk(cache)
+    # An unreadable entry is deleted on read and leaves the total
+    path = cache._path('2317', 'pe')
+    with open(path, 'r+b') as f:
+        f.write(b'\0' * os.path.getsize(path))
+    assert cache.get('2317', 'pe') is None
+    assert not os.path.exists(path)
+    assert cache._size == on_disk(cache)
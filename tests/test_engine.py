@@ -0,0 +1,119 @@
+"""
+Token buckets pace requests per host. AsyncCrawlEngine looks a dataset up
+locally once, times out fetch attempts (not breaker pauses or backoff) and
+an abandoned job stops retrying before run() returns.
+"""
+import asyncio
+import threading
+import time
+
+import pandas as pd
+import pytest
+
+from engine import AsyncCrawlEngine, HostRateLimiter, TokenBucket
+from errors import FetchTimeout
+from jobs import CircuitBreaker, JobRunner, RetryPolicy
+
+class FakeCrawler:
+    """
+    Stands in for StockCrawler: each fetch sleeps `latency` seconds, then returns a
+    one-row frame or raises `error`
+    """
+
+    def __init__(self, code, latency=0.0, error=None):
+        self.raw_stock_code = code
+        self.latency = latency
+        self.error = error
+        self.throttle = None
+        self.requests = []
+        self.lookups = 0
+        self.lock = threading.Lock()
+
+    def local_result(self, dataset):
+        self.lookups += 1
+        return None
+
+    def fetch(self, dataset, local=True):
+        if local:
+            self.local_result(dataset)
+        if self.throttle is not None:
+            self.throttle('https://goodinfo.tw/tw/page.asp')
+        with self.lock:
+            self.requests.append(time.monotonic())
+        time.sleep(self.latency)
+        if self.error is not None:
+            raise self.error
+        return pd.DataFrame({'Year': [2025], 'Month': [6], 'Value': [1.0]})
+
+def grant_times(acquire, count):
+    """
+    Seconds after the first call at which each of `count` acquire() calls returned
+    """
+    async def run():
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        times = []
+        for _ in range(count):
+            await acquire()
+            times.append(loop.time() - started)
+        return times
+    return asyncio.run(run())
+
+def test_token_bucket_allows_a_burst_then_paces():
+    times = grant_times(TokenBucket(rate=20, capacity=2).acquire, 4)
+    assert times[1] < 0.02
+    assert times[2] == pytest.approx(0.05, abs=0.02)
+    assert times[3] == pytest.approx(0.10, abs=0.02)
+
+def test_token_bucket_rejects_a_zero_rate():
+    with pytest.raises(ValueError):
+        TokenBucket(0)
+
+def test_hosts_have_their_own_buckets():
+    limiter = HostRateLimiter(rate=10, burst=1, overrides={'mis.twse.com.tw': (1000, 1)})
+
+    async def acquire():
+        # Alternate hosts: goodinfo waits 0.1s per token, the overridden host hardly at all
+        await limiter.acquire('https://goodinfo.tw/tw/StockDetail.asp')
+        await limiter.acquire('https://mis.twse.com.tw/stock/api')
+
+    times = grant_times(acquire, 3)
+    assert times[0] < 0.02
+    assert times[2] == pytest.approx(0.2, abs=0.03)
+
+def engine(timeout):
+    return AsyncCrawlEngine(max_in_flight=2, rate_limiter=HostRateLimiter(rate=100, burst=10), timeout=timeout)
+
+def test_breaker_pause_does_not_count_toward_the_timeout():
+    breaker = CircuitBreaker(threshold=1, cooldown=0.5)
+    breaker.record(FetchTimeout("refused"))
+    crawler = FakeCrawler('2330', latency=0.05)
+    results = engine(timeout=0.2).run_sync([(crawler, 'pe')], fetch=JobRunner(breaker=breaker).run)
+    assert isinstance(results[('2330', 'pe')], pd.DataFrame)
+    assert breaker.state == 'closed'
+
+def test_slow_attempt_times_out_and_stops_retrying():
+    crawlers = [FakeCrawler(code, latency=0.3, error=FetchTimeout("slow")) for code in ('2330', '2317')]
+    runner = JobRunner(RetryPolicy(attempts=5, base=0.05, cap=0.05), CircuitBreaker(threshold=100))
+    started = time.monotonic()
+    results = engine(timeout=0.1).run_sync([(crawler, 'pe') for crawler in crawlers], fetch=runner.run)
+    returned = time.monotonic()
+    assert all(isinstance(results[(crawler.raw_stock_code, 'pe')], TimeoutError) for crawler in crawlers)
+    # run() waited for the attempts in flight, which were the only requests sent
+    assert returned - started >= 0.3
+    time.sleep(0.2)
+    for crawler in crawlers:
+        assert len(crawler.requests) == 1
+        assert crawler.throttle is None
+
+def test_plain_fetch_times_out_per_job():
+    fast, slow = FakeCrawler('2330'), FakeCrawler('2317', latency=0.3)
+    results = engine(timeout=0.1).run_sync([(fast, 'pe'), (slow, 'pe')])
+    assert isinstance(results[('2330', 'pe')], pd.DataFrame)
+    assert isinstance(results[('2317', 'pe')], TimeoutError)
+
+def test_local_lookup_runs_once_per_job():
+    crawler = FakeCrawler('2330')
+    engine(timeout=1).run_sync([(crawler, 'pe')], fetch=JobRunner().run)
+    assert crawler.lookups == 1
+    assert len(crawler.requests) == 1
@@ -0,0 +1,118 @@
+"""
+HttpBackend against a local stub server: the expected page is returned, a
+page without the marker is a miss that hands the fetch to Selenium, and
+refusals, server errors and dropped connections raise Blocked instead of
+falling back.
+"""
+import socket
+import threading
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from crawler import StockCrawler
+from errors import Blocked, CrawlError
+from fetcher import HttpBackend
+
+PAGE = "<html><body><table id='tblDetail'><tr><td>1</td></tr></table></body></html>"
+INTERSTITIAL = "<html><body><script>setCookie();location.reload();</script></body></html>"
+
+class StubHandler(BaseHTTPRequestHandler):
+    # Path -> (status, body)
+    routes = {
+        '/tw/ShowSaleMonChart.asp': (200, PAGE),
+        '/tw/StockBzPerformance.asp': (200, INTERSTITIAL),
+        '/tw/forbidden.asp': (403, "Forbidden"),
+        '/tw/throttled.asp': (429, "Too Many Requests"),
+        '/tw/unavailable.asp': (503, "Service Unavailable"),
+        '/tw/broken.asp': (500, "Internal Server Error"),
+        '/tw/gateway.asp': (502, "Bad Gateway"),
+    }
+
+    def do_GET(self):
+        status, body = self.routes.get(self.path.split('?', 1)[0], (404, "Not Found"))
+        data = body.encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+@pytest.fixture(scope='module')
+def base_url():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StubHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_address[1]}/tw"
+    server.shutdown()
+    server.server_close()
+
+@pytest.fixture
+def backend():
+    backend = HttpBackend(timeout=5)
+    yield backend
+    backend.close()
+
+class FakeDriver:
+    def get_cookies(self):
+        return [{'name': 'CLIENT_KEY', 'value': 'abc', 'domain': '127.0.0.1', 'path': '/'}]
+
+class FakePool:
+    """
+    Stands in for DriverPool and counts the drivers borrowed
+    """
+
+    def __init__(self):
+        self.borrowed = 0
+
+    @contextmanager
+    def driver(self):
+        self.borrowed += 1
+        yield FakeDriver()
+
+def crawler(base_url, backend, strict=False):
+    crawler = StockCrawler('2330', pool=FakePool(), backend=backend, base_url=base_url, strict=strict)
+    crawler._fetch_page = lambda driver, url, ready: "browser page"
+    return crawler
+
+def test_expected_page_is_returned(base_url, backend):
+    assert backend.fetch(f"{base_url}/ShowSaleMonChart.asp?STOCK_ID=2330") == PAGE
+
+def test_page_without_marker_falls_back_to_selenium(base_url, backend):
+    assert backend.fetch(f"{base_url}/StockBzPerformance.asp?STOCK_ID=2330") is None
+    stock = crawler(base_url, backend)
+    assert stock._fetch(stock.url_for('profit')) == "browser page"
+    assert stock.pool.borrowed == 1
+    # The browser's cookies are handed to the HTTP session
+    assert backend.session.cookies.get('CLIENT_KEY') == 'abc'
+
+def test_static_page_does_not_borrow_a_driver(base_url, backend):
+    stock = crawler(base_url, backend)
+    assert stock._fetch(stock.url_for('revenue')) == PAGE
+    assert stock.pool.borrowed == 0
+
+@pytest.mark.parametrize("page", ['forbidden', 'throttled', 'unavailable', 'broken', 'gateway'])
+def test_refusals_raise_blocked(base_url, backend, page):
+    with pytest.raises(Blocked):
+        backend.fetch(f"{base_url}/{page}.asp")
+    # A refusal is not retried in a browser
+    stock = crawler(base_url, backend, strict=True)
+    with pytest.raises(Blocked):
+        stock._fetch(f"{base_url}/{page}.asp")
+    assert stock.pool.borrowed == 0
+
+def test_refused_connection_raises_blocked(backend):
+    # A port nobody listens on refuses the connection
+    with socket.socket() as listener:
+        listener.bind(('127.0.0.1', 0))
+        port = listener.getsockname()[1]
+    with pytest.raises(Blocked):
+        backend.fetch(f"http://127.0.0.1:{port}/tw/ShowSaleMonChart.asp")
+
+def test_other_errors_are_not_refusals(base_url, backend):
+    with pytest.raises(CrawlError) as error:
+        backend.fetch(f"{base_url}/missing.asp")
+    assert not isinstance(error.value, Blocked)
@@ -0,0 +1,47 @@
+"""
+HistoryStore.append upserts on (stock, period): new periods are inserted,
+a fetched value fills in or revises a stored one, a missing value never
+erases it and unchanged rows are not counted as written.
+"""
+import numpy as np
+import pandas as pd
+import pytest
+
+from history_store import HistoryStore
+
+@pytest.fixture
+def store(tmp_path):
+    store = HistoryStore(str(tmp_path / "history.db"))
+    yield store
+    store.close()
+
+def revenue(*rows):
+    return pd.DataFrame(rows, columns=['Year', 'Month', 'Revenue'])
+
+def stored(store):
+    df = store.load('2330', 'revenue')
+    return {(year, month): value for year, month, value in df.itertuples(index=False)}
+
+def test_new_periods_are_inserted(store):
+    assert store.append('2330', 'revenue', revenue((2025, 1, 10.0), (2025, 2, 20.0))) == 2
+    assert stored(store) == {(2025, 1): 10.0, (2025, 2): 20.0}
+
+def test_unchanged_rows_are_not_counted(store):
+    store.append('2330', 'revenue', revenue((2025, 1, 10.0), (2025, 2, 20.0)))
+    assert store.append('2330', 'revenue', revenue((2025, 1, 10.0), (2025, 2, 20.0), (2025, 3, 30.0))) == 1
+
+def test_missing_value_is_filled_in_later(store):
+    store.append('2330', 'revenue', revenue((2025, 1, np.nan)))
+    assert pd.isna(stored(store)[(2025, 1)])
+    assert store.append('2330', 'revenue', revenue((2025, 1, 10.0))) == 1
+    assert stored(store) == {(2025, 1): 10.0}
+
+def test_value_is_revised_but_never_erased(store):
+    store.append('2330', 'revenue', revenue((2025, 1, 10.0), (2025, 2, 20.0)))
+    assert store.append('2330', 'revenue', revenue((2025, 1, 11.0), (2025, 2, np.nan))) == 1
+    assert stored(store) == {(2025, 1): 11.0, (2025, 2): 20.0}
+
+def test_stocks_are_kept_apart(store):
+    store.append('2330', 'revenue', revenue((2025, 1, 10.0)))
+    assert store.append('2317', 'revenue', revenue((2025, 1, 5.0))) == 1
+    assert stored(store) == {(2025, 1): 10.0}
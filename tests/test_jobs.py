@@ -0,0 +1,138 @@
+"""
+Circuit breaker state changes, retry jitter bounds and resuming a batch
+from its checkpoint.
+"""
+import json
+import threading
+import time
+
+import pandas as pd
+import pytest
+
+from batch import run_batch
+from errors import Blocked, CrawlError, ParseFailure
+from fakes import FakeRunner
+from jobs import Checkpoint, CircuitBreaker, JobCancelled, JobControl, JobRunner, RetryPolicy
+
+COOLDOWN = 0.05
+
+@pytest.fixture
+def breaker():
+    return CircuitBreaker(threshold=2, cooldown=COOLDOWN, max_cooldown=COOLDOWN * 3)
+
+def timed_wait(breaker, job=None):
+    started = time.monotonic()
+    breaker.wait(job)
+    return time.monotonic() - started
+
+def test_breaker_opens_after_consecutive_refusals(breaker):
+    breaker.record(Blocked("refused"))
+    assert breaker.state == 'closed'
+    breaker.record(Blocked("refused"))
+    assert breaker.state == 'open'
+
+def test_answers_from_the_site_reset_the_count(breaker):
+    breaker.record(Blocked("refused"))
+    breaker.record(ParseFailure("no table"))
+    breaker.record(Blocked("refused"))
+    assert breaker.state == 'closed'
+
+def test_unclassified_errors_do_not_reset_the_count(breaker):
+    breaker.record(Blocked("refused"))
+    breaker.record(CrawlError("driver crashed"))
+    breaker.record(RuntimeError("bug"))
+    breaker.record(Blocked("refused"))
+    assert breaker.state == 'open'
+
+def test_unclassified_error_does_not_pass_the_trial(breaker):
+    breaker.record(Blocked("refused"))
+    breaker.record(Blocked("refused"))
+    breaker.wait()
+    breaker.record(CrawlError("driver crashed"))
+    assert (breaker.state, breaker.cooldown) == ('open', COOLDOWN)
+
+class RefusedCrawler:
+    raw_stock_code = '2330'
+
+    def fetch(self, dataset, local=True):
+        raise Blocked("HTTP connection was refused")
+
+def test_refused_connections_open_the_breaker(breaker):
+    runner = JobRunner(RetryPolicy(attempts=1), breaker)
+    for _ in range(2):
+        with pytest.raises(Blocked):
+            runner.run(RefusedCrawler(), 'revenue')
+    assert breaker.state == 'open'
+
+def test_trial_failure_reopens_for_longer_and_success_closes(breaker):
+    breaker.record(Blocked("refused"))
+    breaker.record(Blocked("refused"))
+    assert timed_wait(breaker) >= COOLDOWN * 0.9
+    assert breaker.state == 'half_open'
+    breaker.record(Blocked("refused"))
+    assert (breaker.state, breaker.cooldown) == ('open', COOLDOWN * 2)
+    assert timed_wait(breaker) >= COOLDOWN * 1.8
+    breaker.record(Blocked("refused"))
+    assert breaker.cooldown == COOLDOWN * 3  # Capped at max_cooldown
+    breaker.wait()
+    breaker.record()
+    assert (breaker.state, breaker.cooldown) == ('closed', COOLDOWN)
+    assert timed_wait(breaker) < COOLDOWN
+
+def test_other_jobs_wait_for_the_trial(breaker):
+    breaker.record(Blocked("refused"))
+    breaker.record(Blocked("refused"))
+    breaker.wait()  # This caller runs the trial
+    waited = []
+    waiter = threading.Thread(target=lambda: waited.append(timed_wait(breaker)))
+    waiter.start()
+    time.sleep(COOLDOWN / 2)
+    breaker.record()
+    waiter.join(1)
+    assert waited and waited[0] < COOLDOWN
+
+def test_abandoned_trial_is_handed_to_the_next_job(breaker):
+    breaker.record(Blocked("refused"))
+    breaker.record(Blocked("refused"))
+    breaker.wait()  # The trial never reports back
+    assert timed_wait(breaker) >= COOLDOWN * 0.9
+    assert breaker.state == 'half_open'
+
+def test_cancelled_job_leaves_the_wait(breaker):
+    breaker.record(Blocked("refused"))
+    breaker.record(Blocked("refused"))
+    job = JobControl()
+    job.cancel()
+    with pytest.raises(JobCancelled):
+        breaker.wait(job)
+
+@pytest.mark.parametrize("retry", range(8))
+def test_retry_jitter_stays_within_bounds(retry):
+    policy = RetryPolicy(base=0.5, cap=10.0)
+    delays = [policy.delay(retry) for _ in range(200)]
+    assert all(0 <= delay <= min(10.0, 0.5 * 2 ** retry) for delay in delays)
+    assert len(set(delays)) > 1
+
+def test_checkpoint_reloads_finished_work(tmp_path):
+    path = str(tmp_path / "run.ckpt")
+    checkpoint = Checkpoint(path)
+    checkpoint.dataset_done('2330', 'pe', pd.DataFrame({'Year': [2025], 'P/E Ratio': [20.0]}))
+    checkpoint.dataset_done('2317', 'pe', pd.DataFrame({'Year': [2025], 'P/E Ratio': [10.0]}))
+    checkpoint.stock_done('2330', {'Stock Code': '2330', 'Status': 'ok'})
+    with open(path, 'a', encoding='utf-8') as f:
+        f.write(json.dumps({'stock': '2317', 'dataset': 'revenue'})[:20])  # Cut short by a crash
+    resumed = Checkpoint(path)
+    assert resumed.records == {'2330': {'Stock Code': '2330', 'Status': 'ok'}}
+    assert list(resumed.datasets) == ['2317']
+    assert resumed.datasets['2317']['pe']['P/E Ratio'].tolist() == [10.0]
+
+def test_resumed_batch_skips_finished_work(tmp_path):
+    checkpoint = Checkpoint(str(tmp_path / "run.ckpt"))
+    checkpoint.stock_done('2330', {'Stock Code': '2330', 'Status': 'ok'})
+    checkpoint.dataset_done('2317', 'revenue', pd.DataFrame({'Year': [2025], 'Month': [6], 'Revenue': [1.0]}))
+    runner = FakeRunner()
+    records = run_batch(['2330', '2317'], pool=object(), max_workers=1, output_dir=str(tmp_path), fmt='csv',
+                        runner=runner, checkpoint=Checkpoint(checkpoint.path))
+    assert sorted(runner.jobs) == [('2317', 'pe'), ('2317', 'price'), ('2317', 'profit'), ('2317', 'share')]
+    assert records[0] == {'Stock Code': '2330', 'Status': 'ok'}
+    assert records[1]['Stock Code'] == '2317'
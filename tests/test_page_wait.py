@@ -0,0 +1,62 @@
+"""
+PageWaiter must honour its deadline even when the ad interstitial never goes away.
+"""
+import threading
+import time
+
+from page_wait import AD_BUTTON, PageWaiter
+
+class StuckButton:
+    def __init__(self, driver):
+        self._driver = driver
+
+    def is_displayed(self):
+        return True
+
+    def is_enabled(self):
+        return True
+
+    def click(self):
+        self._driver.clicks += 1
+
+class StuckAdDriver:
+    """
+    A page that only ever shows the ad button, which stays on screen after every click
+    """
+
+    def __init__(self):
+        self.clicks = 0
+        self.polls = 0
+
+    def find_elements(self, by, value):
+        self.polls += 1
+        return [StuckButton(self)] if (by, value) == AD_BUTTON else []
+
+def test_stuck_ad_times_out():
+    waiter = PageWaiter(initial_timeout=0.3, min_timeout=0.3, max_timeout=0.3, poll=0.05, max_dismissals=2)
+    driver = StuckAdDriver()
+    results = []
+    thread = threading.Thread(target=lambda: results.append(waiter.wait(driver, 'ShowSaleMonChart')), daemon=True)
+    start = time.perf_counter()
+    thread.start()
+    thread.join(3)
+    assert not thread.is_alive(), "the waiter kept spinning past its deadline"
+    assert time.perf_counter() - start < 1.5
+    result = results[0]
+    assert result.path == 'timeout'
+    assert result.ads_dismissed == driver.clicks == 2
+    # One round of lookups per poll, not a busy loop
+    assert driver.polls < 100
+
+def test_dismissed_ad_then_content():
+    class AdThenTable(StuckAdDriver):
+        def find_elements(self, by, value):
+            self.polls += 1
+            if self.clicks:
+                return [object()] if by == 'tag name' else []
+            return super().find_elements(by, value)
+
+    driver = AdThenTable()
+    result = PageWaiter(initial_timeout=1.0, min_timeout=1.0, max_timeout=1.0, poll=0.01).wait(driver, 'StockDetail')
+    assert result.path == 'ready'
+    assert result.ads_dismissed == 1
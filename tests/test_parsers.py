@@ -0,0 +1,132 @@
+"""
+The single-pass parsers must read the fixture pages exactly like the
+original per-row BeautifulSoup lookups did, on both the lxml and the bs4
+path, and must not be slower than them.
+
+Run from the repository root: pytest -q
+"""
+import os
+import re
+import time
+import pandas as pd
+import pytest
+from bs4 import BeautifulSoup
+
+import parsers
+
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "benchmarks", "fixtures")
+
+# Fixture page -> dataset parsed from it
+PAGES = {
+    "ShowSaleMonChart.html": "revenue",
+    "StockBzPerformance.html": "profit",
+    "ShowK_ChartFlow.html": "pe",
+    "ShowK_ChartFlow_5y.html": "pe",
+    "EquityDistributionClassHis.html": "share",
+}
+
+def _fixture(name):
+    with open(os.path.join(FIXTURE_DIR, name), encoding="utf-8") as f:
+        return f.read()
+
+# The row lookups of the original crawler, one find('tr', {'id': f'row{i}'}) per row
+
+def legacy_revenue(html):
+    table = BeautifulSoup(html, 'html.parser').find('table', {'id': 'tblDetail'})
+    data = []
+    for i in range(36):
+        row = table.find('tr', {'id': f'row{i}'})
+        if not row:
+            break
+        cols = row.find_all('td')
+        if len(cols) >= 8:
+            year_month = cols[0].text.strip()
+            revenue = cols[7].text.strip().replace(',', '')
+            if re.match(r'\d{4}/\d{2}', year_month):
+                year, month = map(int, year_month.split('/'))
+                data.append({'Year': year, 'Month': month, 'Revenue': float(revenue) if revenue else None})
+    return pd.DataFrame(data).tail(36)
+
+def legacy_profit_ratio(html):
+    table = BeautifulSoup(html, 'html.parser').find('table', {'id': 'tblDetail'})
+    data = []
+    for i in range(6):
+        row = table.find('tr', {'id': f'row{i}'})
+        if not row:
+            break
+        cols = row.find_all('td')
+        if len(cols) >= 16:
+            year = cols[0].text.strip()
+            margin = cols[15].text.strip().replace('%', '')
+            if re.match(r'\d{4}', year) and margin and margin != '-':
+                data.append({'Year': int(year), 'Month': 12, 'Net Profit Margin': float(margin)})
+    return pd.DataFrame(data).tail(5)
+
+def legacy_pe_ratio(html):
+    table = BeautifulSoup(html, 'html.parser').find('table', {'id': 'tblDetail'})
+    data = []
+    for i in range(180):
+        row = table.find('tr', {'id': f'row{i}'})
+        if not row:
+            break
+        cols = row.find_all('td')
+        if len(cols) >= 6:
+            week_str = cols[0].text.strip()
+            pe_ratio = cols[5].text.strip()
+            if re.match(r'\d{2}W\d{1,2}', week_str):
+                year, week = week_str.split('W')
+                data.append({'Year': "20" + year, 'Week': week,
+                             'P/E Ratio': float(pe_ratio) if pe_ratio and pe_ratio != '-' else None})
+    df = pd.DataFrame(data).tail(180)
+    # The original kept year and week as strings, the parser returns integers
+    return df.astype({'Year': int, 'Week': int})
+
+def legacy_share_number(html):
+    row = BeautifulSoup(html, 'html.parser').find('tr', {'id': 'row1'})
+    share = row.find_all('td')[5].text.strip().replace(',', '')
+    return pd.DataFrame([{'Share': float(share) if share else None}])
+
+LEGACY = {
+    'revenue': legacy_revenue,
+    'profit': legacy_profit_ratio,
+    'pe': legacy_pe_ratio,
+    'share': legacy_share_number,
+}
+
+@pytest.fixture(params=["lxml", "bs4"])
+def backend(request, monkeypatch):
+    if request.param == "lxml":
+        if parsers.lxml_html is None:
+            pytest.skip("lxml is not installed")
+    else:
+        # BeautifulSoup is only imported by parsers when lxml is missing
+        monkeypatch.setattr(parsers, "lxml_html", None)
+        monkeypatch.setattr(parsers, "BeautifulSoup", BeautifulSoup, raising=False)
+    return request.param
+
+@pytest.mark.parametrize("page", sorted(PAGES))
+def test_matches_legacy_parser(backend, page):
+    dataset = PAGES[page]
+    html = _fixture(page)
+    expected = LEGACY[dataset](html).reset_index(drop=True)
+    result = parsers.to_frame(parsers.parse(dataset, html, '2330'))
+    if dataset == 'share':
+        result = result[['Share']]  # The date columns are the time of parsing
+    assert not result.empty
+    pd.testing.assert_frame_equal(result, expected, check_dtype=False)
+
+@pytest.mark.parametrize("page", ["ShowSaleMonChart.html", "ShowK_ChartFlow_5y.html"])
+def test_faster_than_legacy_parser(backend, page):
+    dataset = PAGES[page]
+    html = _fixture(page)
+
+    # Alternate the two so a busy machine slows both alike, keep the best run of each
+    legacy, current = float('inf'), float('inf')
+    for _ in range(7):
+        start = time.perf_counter()
+        LEGACY[dataset](html)
+        middle = time.perf_counter()
+        parsers.parse(dataset, html)
+        legacy, current = min(legacy, middle - start), min(current, time.perf_counter() - middle)
+    print(f"{page} {backend}: legacy {legacy * 1000:.1f}ms, single pass {current * 1000:.1f}ms")
+    assert current < legacy
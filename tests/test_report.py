@@ -0,0 +1,28 @@
+"""
+summarize() only predicts prices when every input of the grid is known.
+"""
+import pandas as pd
+
+from report import summarize, summary_record
+
+def stock_data(pe=(10.0, 12.0, 14.0)):
+    return {
+        'revenue': pd.DataFrame({'Year': [2025] * 12, 'Month': range(1, 13), 'Revenue': [100.0] * 12}),
+        'profit': pd.DataFrame({'Year': [2024, 2023], 'Net Profit Margin': [20.0, 10.0]}),
+        'pe': pd.DataFrame({'Year': [2025] * len(pe), 'Month': [6] * len(pe), 'P/E Ratio': list(pe)}),
+        'price': pd.DataFrame({'Year': [2025], 'Month': [6], 'Price': [50.0]}),
+        'share': pd.DataFrame({'Year': [2025], 'Month': [6], 'Share': [10.0]}),
+    }
+
+def test_predicts_nine_prices():
+    summary = summarize('2330', stock_data())
+    prices = dict(summary['Predictions'])
+    assert len(prices) == 9
+    # Revenue per share 1200 * 10 / (10 / 10) = 12000, times 10% margin and P/E 10
+    assert prices['Min Profit * Min PE'] == 12000 * 0.10 * 10
+
+def test_stock_without_pe_rows_gets_no_predictions():
+    summary = summarize('2330', stock_data(pe=()))
+    assert summary['Predictions'] == []
+    assert pd.isna(summary['PE Min'])
+    assert not any(label.endswith(' PE') for label in summary_record(summary))
@@ -0,0 +1,74 @@
+"""
+Publication cadences of the refresh scheduler, and the budgeted, most
+overdue first ordering of its queue.
+"""
+from datetime import datetime
+
+import pytest
+
+from fakes import FakeRunner
+from history_store import HistoryStore
+from scheduler import RefreshScheduler, next_due
+
+@pytest.mark.parametrize("dataset, last, due", [
+    # Monthly revenue is due on the 11th, rolling over to the next month (and year)
+    ('revenue', datetime(2025, 6, 5, 9), datetime(2025, 6, 11)),
+    ('revenue', datetime(2025, 6, 11), datetime(2025, 7, 11)),
+    ('revenue', datetime(2025, 6, 11, 9), datetime(2025, 7, 11)),
+    ('revenue', datetime(2025, 12, 20), datetime(2026, 1, 11)),
+    # Financial statements follow the filing deadlines, wrapping to the next year's annual report
+    ('profit', datetime(2025, 3, 31), datetime(2025, 4, 1)),
+    ('profit', datetime(2025, 4, 1, 10), datetime(2025, 5, 16)),
+    ('profit', datetime(2025, 8, 14), datetime(2025, 8, 15)),
+    ('profit', datetime(2025, 11, 20), datetime(2026, 4, 1)),
+    # Weekly P/E is due on Saturday, after Friday's session
+    ('pe', datetime(2025, 6, 13, 15), datetime(2025, 6, 14)),
+    ('pe', datetime(2025, 6, 14, 10), datetime(2025, 6, 21)),
+    ('pe', datetime(2025, 6, 15), datetime(2025, 6, 21)),
+    # Closing prices are due at the market close of the next trading day
+    ('price', datetime(2025, 6, 16, 9), datetime(2025, 6, 16, 13, 30)),
+    ('price', datetime(2025, 6, 16, 14), datetime(2025, 6, 17, 13, 30)),
+    ('price', datetime(2025, 6, 13, 14), datetime(2025, 6, 16, 13, 30)),
+    ('price', datetime(2025, 6, 14, 10), datetime(2025, 6, 16, 13, 30)),
+    # Share capital is checked on the first of every month
+    ('share', datetime(2025, 6, 5), datetime(2025, 7, 1)),
+    ('share', datetime(2025, 12, 5), datetime(2026, 1, 1)),
+])
+def test_next_due(dataset, last, due):
+    assert next_due(dataset, last) == due
+
+@pytest.mark.parametrize("dataset", ['revenue', 'profit', 'pe', 'price', 'share'])
+def test_never_fetched_is_due_first(dataset):
+    assert next_due(dataset, None) == datetime.min
+
+NOW = datetime(2025, 6, 20, 12)  # A Friday before the market close
+FRESH = datetime(2025, 6, 20, 11)
+
+@pytest.fixture
+def store():
+    store = HistoryStore(':memory:')
+    # A and B are fresh except for A's revenue (due 2025-05-11) and B's P/E (due 2025-06-07); C was never fetched
+    stale = {('A', 'revenue'): datetime(2025, 5, 1), ('B', 'pe'): datetime(2025, 6, 1)}
+    for code in ('A', 'B'):
+        for dataset in ('revenue', 'profit', 'pe', 'price', 'share'):
+            store.record_fetch(code, dataset, stale.get((code, dataset), FRESH))
+    yield store
+    store.close()
+
+def scheduler(store, budget=None):
+    return RefreshScheduler(store, ['A', 'B', 'C'], pool=object(), runner=FakeRunner(fetched_at=NOW), max_workers=1, budget=budget)
+
+def test_queue_orders_by_how_long_pairs_have_been_due(store):
+    heap = scheduler(store).queue(NOW)
+    order = [(code, dataset) for _, code, dataset in sorted(heap)]
+    assert order == [('C', 'pe'), ('C', 'price'), ('C', 'profit'), ('C', 'revenue'), ('C', 'share'),
+                     ('A', 'revenue'), ('B', 'pe')]
+
+def test_run_once_spends_the_budget_on_the_most_overdue(store):
+    refresh = scheduler(store, budget=6)
+    refreshed, failed, remaining = refresh.run_once(NOW)
+    assert (refreshed, failed, remaining) == (6, 0, 1)
+    assert sorted(refresh.runner.jobs) == [('A', 'revenue'), ('C', 'pe'), ('C', 'price'), ('C', 'profit'),
+                                           ('C', 'revenue'), ('C', 'share')]
+    # The refreshed pairs are logged, so only B's P/E is still due
+    assert [(code, dataset) for _, code, dataset in refresh.queue(NOW)] == [('B', 'pe')]
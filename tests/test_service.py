@@ -0,0 +1,100 @@
+"""
+SingleFlight merges concurrent calls for one key, and ValuationService
+serves datasets from memory while they are fresh (counted from when they
+were downloaded) and keeps a bounded set of crawlers.
+"""
+import threading
+import time
+from datetime import datetime, timedelta
+
+from fakes import FakeRunner
+from service import SingleFlight, ValuationService
+
+CALLERS = 8
+
+def call_together(fn):
+    """
+    Run fn from CALLERS threads released at the same moment, return what each got (result or exception)
+    """
+    barrier = threading.Barrier(CALLERS)
+    outcomes = []
+    lock = threading.Lock()
+
+    def caller():
+        barrier.wait()
+        try:
+            outcome = fn()
+        except Exception as e:
+            outcome = e
+        with lock:
+            outcomes.append(outcome)
+
+    threads = [threading.Thread(target=caller) for _ in range(CALLERS)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(5)
+    return outcomes
+
+def test_concurrent_calls_for_one_key_run_once():
+    flight = SingleFlight()
+    calls = []
+
+    def fetch():
+        calls.append(1)
+        time.sleep(0.2)
+        return object()
+
+    outcomes = call_together(lambda: flight.do(('2330', 'pe'), fetch))
+    assert len(calls) == 1
+    assert len(outcomes) == CALLERS and all(outcome is outcomes[0] for outcome in outcomes)
+    # The key is released once the call finished
+    flight.do(('2330', 'pe'), fetch)
+    assert len(calls) == 2
+
+def test_leader_exception_reaches_every_follower():
+    flight = SingleFlight()
+    error = ValueError("blocked")
+
+    def fetch():
+        time.sleep(0.2)
+        raise error
+
+    outcomes = call_together(lambda: flight.do(('2330', 'pe'), fetch))
+    assert len(outcomes) == CALLERS and all(outcome is error for outcome in outcomes)
+
+def service(runner, **kwargs):
+    return ValuationService(pool=object(), runner=runner, ttls={'pe': timedelta(hours=1)}, **kwargs)
+
+def test_dataset_is_served_from_memory_within_its_ttl():
+    runner = FakeRunner(fetched_at=datetime.now() - timedelta(minutes=30))
+    valuations = service(runner)
+    first = valuations.dataset('2330', 'pe')
+    assert valuations.dataset('2330', 'pe') is first
+    assert runner.jobs == [('2330', 'pe')]
+    valuations.close()
+
+def test_dataset_is_fetched_again_once_its_download_expired():
+    # Served from a disk cache entry downloaded before the TTL
+    runner = FakeRunner(fetched_at=datetime.now() - timedelta(hours=2))
+    valuations = service(runner)
+    valuations.dataset('2330', 'pe')
+    valuations.dataset('2330', 'pe')
+    assert runner.jobs == [('2330', 'pe'), ('2330', 'pe')]
+    valuations.close()
+
+def test_concurrent_requests_fetch_once():
+    runner = FakeRunner(delay=0.2)
+    valuations = service(runner)
+    call_together(lambda: valuations.dataset('2330', 'pe'))
+    assert runner.jobs == [('2330', 'pe')]
+    valuations.close()
+
+def test_least_recently_used_crawler_is_dropped():
+    valuations = service(FakeRunner(), max_crawlers=2)
+    first = valuations.crawler('2330')
+    valuations.crawler('2317')
+    assert valuations.crawler('2330') is first
+    valuations.crawler('2454')
+    assert list(valuations._crawlers) == ['2330', '2454']
+    valuations.close()
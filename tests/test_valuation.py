@@ -0,0 +1,69 @@
+"""
+The vectorized valuation matches the original per-stock formula, and stocks
+without data (or no stocks at all) give NaN rows (or an empty table).
+"""
+import numpy as np
+import pandas as pd
+import pytest
+
+from valuation import grid_labels, price_grid, valuation_table
+
+REVENUE = [float(value) for value in range(100, 124)]
+PROFIT = [12.0, 8.0, 10.0]
+PE = [15.0, 11.0, 13.0, 20.0]
+PRICE, SHARE = 150.0, 250.0
+
+def min_mean_max(values):
+    return [min(values), sum(values) / len(values), max(values)]
+
+def scalar_prices(revenue, profit, pe, share):
+    """
+    The price grid as the original main.py computed it, one scenario at a time
+    """
+    latest_12_months_revenue = sum(revenue[-12:])
+    prices = []
+    for p in min_mean_max(profit):
+        for e in min_mean_max(pe):
+            prices.append((latest_12_months_revenue * 10 * (p / 100) / (share / 10)) * e)
+    return prices
+
+def long_frame(column, values, code='2330'):
+    return pd.DataFrame({'Stock Code': code, 'Year': 2025, 'Month': range(1, len(values) + 1), column: values})
+
+def history(pe=PE):
+    return {
+        'revenue': long_frame('Revenue', REVENUE),
+        'profit': long_frame('Net Profit Margin', PROFIT),
+        'pe': long_frame('P/E Ratio', pe),
+        'price': long_frame('Price', [PRICE]),
+        'share': long_frame('Share', [SHARE]),
+    }
+
+def test_price_grid_matches_the_scalar_formula():
+    grid = price_grid([sum(REVENUE[-12:])], [SHARE], [min_mean_max(PROFIT)], [min_mean_max(PE)])
+    assert grid.shape == (1, 3, 3)
+    assert grid[0].ravel() == pytest.approx(scalar_prices(REVENUE, PROFIT, PE, SHARE))
+
+def test_valuation_table_matches_the_scalar_formula():
+    table = valuation_table(history(), ['2330'])
+    row = table.iloc[0]
+    expected = scalar_prices(REVENUE, PROFIT, PE, SHARE)
+    assert [row[label] for label in grid_labels()] == pytest.approx(expected)
+    assert row['Current Price'] == PRICE
+    assert row['Latest P/E Ratio'] == PE[0]
+    # The fair price takes the median profit margin and P/E scenario
+    assert row['Fair Price'] == pytest.approx(expected[4])
+    assert row['Fair Upside %'] == pytest.approx((expected[4] / PRICE - 1) * 100)
+
+def test_stock_without_pe_history_is_not_valued():
+    table = valuation_table(history(pe=[]), ['2330', '2317'])
+    assert list(table['Stock Code']) == ['2330', '2317']
+    prices = table[grid_labels() + ['Fair Price', 'Fair Upside %', 'Max Upside %', 'Max Downside %']]
+    assert np.isnan(prices.to_numpy(dtype=float)).all()
+    assert table.loc[0, 'Current Price'] == PRICE
+    assert np.isnan(table.loc[1, 'Current Price'])
+
+def test_no_stocks_give_an_empty_table():
+    table = valuation_table(history(), [])
+    assert table.empty
+    assert list(table.columns[-4:]) == ['Fair Price', 'Fair Upside %', 'Max Upside %', 'Max Downside %']
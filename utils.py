@@ -1,60 +1,67 @@
-from openpyxl import Workbook
 from openpyxl.styles import PatternFill, Border, Side, Alignment, Font
-from openpyxl.utils.dataframe import dataframe_to_rows
+from urllib.parse import urlsplit
 
-def write_raw_data(ws, df):
-    """
-    Write DataFrame to a worksheet and auto-adjust column width
-    """
-    for r in dataframe_to_rows(df, index=False, header=True):
-        ws.append(r)
-    # Auto-adjust column width
-    for col in ws.columns:
-        max_length = 0
-        column = col[0].column_letter
-        for cell in col:
-            try:
-                if len(str(cell.value)) > max_length:
-                    max_length = len(str(cell.value))
-            except:
-                pass
-        adjusted_width = (max_length + 1)
-        ws.column_dimensions[column].width = adjusted_width
+def page_name(url):
+    """
+    Metrics label of a goodinfo page, e.g. ShowSaleMonChart
+    """
+    return urlsplit(url).path.rsplit('/', 1)[-1].rsplit('.', 1)[0]
+
+def is_empty_frame(df):
+    """
+    Whether a fetch produced no usable data (the crawler returns empty frames,
+    or single rows of None, on failure)
+    """
+    return df is None or df.empty or df.drop(columns=["Year", "Month"], errors="ignore").isna().all().all()
+
+def column_widths(df):
+    """
+    Width of every column of a DataFrame (header included), computed from the data in one pass
+    """
+    widths = []
+    for name in df.columns:
+        values = df[name]
+        longest = values.map(lambda value: len(str(value))).max() if len(values) else 0
+        widths.append(max(len(str(name)), int(longest)) + 1)
+    return widths
 
-def style_summary_sheet(ws):
-    """
-    Apply styling to the Summary sheet
-    """
-    header_fill = PatternFill(start_color="1E3A8A", end_color="1E3A8A", fill_type="solid")
-    subheader_fill = PatternFill(start_color="BFDBFE", end_color="BFDBFE", fill_type="solid")
-    border = Border(left=Side(style="thin"), right=Side(style="thin"), 
-                    top=Side(style="thin"), bottom=Side(style="thin"))
-    header_font = Font(bold=True, color="FFFFFF")
-    subheader_font = Font(bold=True)
-    align_center = Alignment(horizontal="center", vertical="center")
-    
-    for row in ws.rows:
-        for cell in row:
-            cell.border = border
-            if cell.row == 1 or cell.row in [6, 11, 16]:  # Header rows
-                cell.fill = header_fill
-                cell.font = header_font
-                cell.alignment = align_center
-            elif cell.row in [2, 3, 4, 7, 8, 9, 12, 13, 14, 17, 18, 19, 20, 21, 22 ,23, 24, 25]:  # Subheader or data rows
-                if cell.column == 1:
-                    cell.fill = subheader_fill
-                    cell.font = subheader_font
-                cell.alignment = align_center
-    
-    # Auto-adjust column width
-    for col in ws.columns:
-        max_length = 0
-        column = col[0].column_letter
-        for cell in col:
-            try:
-                if len(str(cell.value)) > max_length:
-                    max_length = len(str(cell.value))
-            except:
-                pass
-        adjusted_width = (max_length + 1)
-        ws.column_dimensions[column].width = adjusted_width
\ No newline at end of file
+def rows_widths(rows):
+    """
+    Width of every column of a list of rows
+    """
+    widths = []
+    for row in rows:
+        for i, value in enumerate(row):
+            length = len(str(value)) + 1
+            if i == len(widths):
+                widths.append(length)
+            elif length > widths[i]:
+                widths[i] = length
+    return widths
+
+SUMMARY_HEADER_ROWS = {1, 6, 11, 16}
+SUMMARY_DATA_ROWS = {2, 3, 4, 7, 8, 9, 12, 13, 14, 17, 18, 19, 20, 21, 22, 23, 24, 25}
+
+HEADER_FILL = PatternFill(start_color="1E3A8A", end_color="1E3A8A", fill_type="solid")
+SUBHEADER_FILL = PatternFill(start_color="BFDBFE", end_color="BFDBFE", fill_type="solid")
+BORDER = Border(left=Side(style="thin"), right=Side(style="thin"),
+                top=Side(style="thin"), bottom=Side(style="thin"))
+HEADER_FONT = Font(bold=True, color="FFFFFF")
+SUBHEADER_FONT = Font(bold=True)
+ALIGN_CENTER = Alignment(horizontal="center", vertical="center")
+
+def summary_cell_style(row, column):
+    """
+    Style attributes of a Summary sheet cell at 1-based (row, column)
+    """
+    style = {"border": BORDER}
+    if row in SUMMARY_HEADER_ROWS:  # Header rows
+        style["fill"] = HEADER_FILL
+        style["font"] = HEADER_FONT
+        style["alignment"] = ALIGN_CENTER
+    elif row in SUMMARY_DATA_ROWS:  # Subheader or data rows
+        if column == 1:
+            style["fill"] = SUBHEADER_FILL
+            style["font"] = SUBHEADER_FONT
+        style["alignment"] = ALIGN_CENTER
+    return style
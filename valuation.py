@@ -0,0 +1,166 @@
+import numpy as np
+import pandas as pd
+import warnings
+
+# Statistics of the P/E and profit margin history used as valuation scenarios.
+# Each entry is 'min', 'mean', 'max' or a percentile between 0 and 100.
+DEFAULT_STATS = ('min', 'mean', 'max')
+
+STAT_LABELS = {'min': 'Min', 'mean': 'Avg', 'max': 'Max'}
+
+# History windows of the single-stock valuation
+WINDOWS = {'revenue': 36, 'profit': 5, 'pe': 180, 'price': 1, 'share': 1}
+
+def stat_label(stat):
+    return STAT_LABELS.get(stat, f"P{stat:g}" if not isinstance(stat, str) else stat)
+
+def grid_labels(profit_stats=DEFAULT_STATS, pe_stats=DEFAULT_STATS):
+    """
+    Labels of the flattened price grid, profit scenario major
+    """
+    return [f"{stat_label(profit)} Profit * {stat_label(pe)} PE" for profit in profit_stats for pe in pe_stats]
+
+def reduce_stats(matrix, stats=DEFAULT_STATS):
+    """
+    Reduce each row of a NaN-padded (stocks x periods) matrix to the given statistics, shape (stocks, len(stats))
+    """
+    matrix = np.asarray(matrix, dtype=np.float64)
+    columns = []
+    for stat in stats:
+        if stat == 'min':
+            columns.append(np.nanmin(matrix, axis=1, initial=np.inf, where=~np.isnan(matrix)))
+        elif stat == 'max':
+            columns.append(np.nanmax(matrix, axis=1, initial=-np.inf, where=~np.isnan(matrix)))
+        elif stat == 'mean':
+            counts = np.sum(~np.isnan(matrix), axis=1)
+            with np.errstate(invalid='ignore', divide='ignore'):
+                columns.append(np.nansum(matrix, axis=1) / counts)
+        else:
+            with warnings.catch_warnings():
+                warnings.simplefilter('ignore', RuntimeWarning)  # All-NaN rows give NaN
+                columns.append(np.nanpercentile(matrix, float(stat), axis=1) if matrix.shape[1] else np.full(len(matrix), np.nan))
+    result = np.column_stack(columns) if columns else np.empty((len(matrix), 0))
+    # Rows without any data reduce to +-inf for min/max, report them as missing
+    result[~np.isfinite(result)] = np.nan
+    return result
+
+def price_grid(revenue_12m, share, profit_stats, pe_stats):
+    """
+    Predicted prices of every (profit margin, P/E) scenario for many stocks at once.
+    revenue_12m and share have shape (stocks,), profit_stats (stocks, N) and
+    pe_stats (stocks, M); the result has shape (stocks, N, M). Stocks with
+    missing or zero revenue/share get NaN prices.
+    """
+    revenue_12m = np.asarray(revenue_12m, dtype=np.float64)
+    share = np.asarray(share, dtype=np.float64)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        # 除以10的部分是股本要換算回股數要除以10的票面價值
+        revenue_per_share = revenue_12m * 10 / (share / 10)
+    revenue_per_share[~np.isfinite(revenue_per_share) | (revenue_per_share == 0)] = np.nan
+    profit = np.asarray(profit_stats, dtype=np.float64) / 100
+    pe = np.asarray(pe_stats, dtype=np.float64)
+    return revenue_per_share[:, None, None] * profit[:, :, None] * pe[:, None, :]
+
+def ragged_matrix(long_df, value_column, stock_codes, window=None):
+    """
+    Turn a long (Stock Code, ..., value) frame, rows in crawler order per stock,
+    into a left-aligned NaN-padded (stocks x periods) matrix and the row count per stock
+    """
+    index = pd.Index(stock_codes)
+    if long_df is None or long_df.empty:
+        return np.full((len(index), 0), np.nan), np.zeros(len(index), dtype=np.int64)
+    df = long_df[long_df['Stock Code'].isin(index)]
+    rows = index.get_indexer(df['Stock Code'])
+    positions = df.groupby('Stock Code').cumcount().to_numpy()
+    if window is not None:
+        keep = positions < window
+        rows, positions, values = rows[keep], positions[keep], df[value_column].to_numpy(dtype=np.float64)[keep]
+    else:
+        values = df[value_column].to_numpy(dtype=np.float64)
+    width = int(positions.max()) + 1 if len(positions) else 0
+    matrix = np.full((len(index), width), np.nan)
+    matrix[rows, positions] = values
+    lengths = np.bincount(rows, minlength=len(index))
+    return matrix, lengths
+
+def valuation_table(history, stock_codes, profit_stats=DEFAULT_STATS, pe_stats=DEFAULT_STATS):
+    """
+    Value many stocks at once from long frames per dataset (as returned by
+    HistoryStore.load_all). Returns one row per stock with the price grid,
+    the current price and the upside/downside of the grid versus that price.
+    """
+    stock_codes = [str(code) for code in stock_codes]
+    revenue, revenue_lengths = ragged_matrix(history.get('revenue'), 'Revenue', stock_codes, WINDOWS['revenue'])
+    profit, _ = ragged_matrix(history.get('profit'), 'Net Profit Margin', stock_codes, WINDOWS['profit'])
+    pe, pe_lengths = ragged_matrix(history.get('pe'), 'P/E Ratio', stock_codes, WINDOWS['pe'])
+    price, _ = ragged_matrix(history.get('price'), 'Price', stock_codes, 1)
+    share, _ = ragged_matrix(history.get('share'), 'Share', stock_codes, 1)
+
+    # Sum of the last 12 rows in crawler order, like the single-stock summary
+    revenue_12m = np.full(len(stock_codes), np.nan)
+    enough = revenue_lengths >= 12
+    if enough.any():
+        columns = revenue_lengths[enough, None] - 12 + np.arange(12)
+        revenue_12m[enough] = np.nansum(np.take_along_axis(revenue[enough], columns, axis=1), axis=1)
+
+    current_price = price[:, 0] if price.shape[1] else np.full(len(stock_codes), np.nan)
+    share_number = share[:, 0] if share.shape[1] else np.full(len(stock_codes), np.nan)
+    profit_values = reduce_stats(profit, profit_stats)
+    pe_values = reduce_stats(pe, pe_stats)
+    grid = price_grid(revenue_12m, share_number, profit_values, pe_values)
+    flat = grid.reshape(len(stock_codes), len(profit_stats) * len(pe_stats))
+
+    table = pd.DataFrame({
+        'Stock Code': stock_codes,
+        'Current Price': current_price,
+        'Share Number': share_number,
+        'Latest P/E Ratio': np.where(pe_lengths > 0, pe[:, 0] if pe.shape[1] else np.nan, np.nan),
+        'Latest 12 Months Revenue': revenue_12m,
+    })
+    for i, label in enumerate(grid_labels(profit_stats, pe_stats)):
+        table[label] = flat[:, i]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        low = np.nanmin(flat, axis=1, initial=np.inf, where=~np.isnan(flat))
+        high = np.nanmax(flat, axis=1, initial=-np.inf, where=~np.isnan(flat))
+        # The fair value is the price at the median profit margin and median P/E scenario,
+        # which is the centre of the grid for sorted odd-sized stats and still defined for even-sized ones
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', RuntimeWarning)  # Stocks without data give NaN
+            fair = price_grid(revenue_12m, share_number, np.nanmedian(profit_values, axis=1, keepdims=True),
+                              np.nanmedian(pe_values, axis=1, keepdims=True))[:, 0, 0]
+        table['Fair Price'] = fair
+        table['Fair Upside %'] = (fair / current_price - 1) * 100
+        table['Max Upside %'] = (high / current_price - 1) * 100
+        table['Max Downside %'] = (low / current_price - 1) * 100
+    return table.replace([np.inf, -np.inf], np.nan)
+
+def parse_stats(text):
+    """
+    Parse a comma separated list of statistics, e.g. "min,mean,max" or "10,50,90"
+    """
+    stats = []
+    for item in text.split(','):
+        item = item.strip().lower()
+        if item in STAT_LABELS:
+            stats.append(item)
+        else:
+            percentile = float(item)
+            if not 0 <= percentile <= 100:
+                raise ValueError(f"Percentile out of range: {item}")
+            stats.append(percentile)
+    return tuple(stats)
+
+def screen(table, sort_by='Fair Upside %', ascending=False, top=None):
+    """
+    Rank a valuation table, stocks that cannot be valued go last
+    """
+    if sort_by not in table.columns:
+        raise ValueError(f"Cannot sort by {sort_by!r}, the columns are: {', '.join(table.columns)}")
+    ranked = table.sort_values(sort_by, ascending=ascending, na_position='last').reset_index(drop=True)
+    return ranked.head(top) if top else ranked
+
+def load_history(store, stock_codes=None):
+    """
+    Load the valuation windows of every dataset from a HistoryStore in one query per dataset
+    """
+    return {dataset: store.load_all(dataset, stock_codes=stock_codes, window=window) for dataset, window in WINDOWS.items()}
@@ -0,0 +1,121 @@
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.utils import get_column_letter
+from utils import column_widths, rows_widths, summary_cell_style
+import json
+import math
+import os
+import pandas as pd
+
+# Only --format parquet needs pyarrow
+try:
+    import pyarrow
+except ImportError:
+    pyarrow = None
+
+FORMATS = ("xlsx", "csv", "parquet", "jsonl")
+
+def _cell_value(value):
+    # openpyxl writes NaN as an invalid number, leave the cell empty instead
+    if isinstance(value, float) and math.isnan(value):
+        return None
+    return value
+
+def _set_widths(ws, widths):
+    # Write-only sheets only accept column widths before the first row is written
+    for i, width in enumerate(widths, start=1):
+        ws.column_dimensions[get_column_letter(i)].width = width
+
+def _append_frame(wb, title, df):
+    ws = wb.create_sheet(title)
+    _set_widths(ws, column_widths(df))
+    ws.append([str(name) for name in df.columns])
+    for row in df.itertuples(index=False, name=None):
+        ws.append([_cell_value(value) for value in row])
+
+def write_xlsx(path, sheets, summary_rows=None):
+    """
+    Stream (sheet name, DataFrame) pairs into a write-only workbook, with an
+    optional styled Summary sheet first. Column widths come from the data, so
+    no cell is visited twice.
+    """
+    wb = Workbook(write_only=True)
+    if summary_rows is not None:
+        ws = wb.create_sheet("Summary")
+        _set_widths(ws, rows_widths(summary_rows))
+        for r, row in enumerate(summary_rows, start=1):
+            cells = []
+            for c, value in enumerate(row, start=1):
+                cell = WriteOnlyCell(ws, value=_cell_value(value))
+                for name, style in summary_cell_style(r, c).items():
+                    setattr(cell, name, style)
+                cells.append(cell)
+            ws.append(cells)
+    for title, df in sheets:
+        _append_frame(wb, title, df)
+    wb.save(path)
+    return path
+
+def write_csv(directory, sheets):
+    """
+    Write each (name, DataFrame) pair as <directory>/<name>.csv
+    """
+    os.makedirs(directory, exist_ok=True)
+    for name, df in sheets:
+        df.to_csv(os.path.join(directory, f"{_file_name(name)}.csv"), index=False, encoding="utf-8")
+    return directory
+
+def write_parquet(directory, sheets):
+    """
+    Write each (name, DataFrame) pair as <directory>/<name>.parquet (needs pyarrow)
+    """
+    if pyarrow is None:
+        raise RuntimeError("Parquet output needs pyarrow, install it with: pip install pyarrow")
+    os.makedirs(directory, exist_ok=True)
+    for name, df in sheets:
+        # Parquet column names must be strings
+        df.rename(columns=str).to_parquet(os.path.join(directory, f"{_file_name(name)}.parquet"), index=False)
+    return directory
+
+def write_jsonl(path, sheets):
+    """
+    Write every row of every (name, DataFrame) pair as one JSON object per line,
+    tagged with the dataset name
+    """
+    with open(path, "w", encoding="utf-8") as f:
+        for name, df in sheets:
+            columns = [str(column) for column in df.columns]
+            for row in df.itertuples(index=False, name=None):
+                record = {"dataset": name}
+                record.update((column, _json_value(value)) for column, value in zip(columns, row))
+                f.write(json.dumps(record, ensure_ascii=False))
+                f.write("\n")
+    return path
+
+def write_output(base_path, sheets, fmt="xlsx", summary_rows=None):
+    """
+    Write (name, DataFrame) pairs in the given format. base_path has no
+    extension: xlsx and jsonl produce one file, csv and parquet a directory.
+    Return the path written.
+    """
+    if fmt == "xlsx":
+        return write_xlsx(f"{base_path}.xlsx", sheets, summary_rows=summary_rows)
+    if fmt == "csv":
+        return write_csv(base_path, sheets)
+    if fmt == "parquet":
+        return write_parquet(base_path, sheets)
+    if fmt == "jsonl":
+        return write_jsonl(f"{base_path}.jsonl", sheets)
+    raise ValueError(f"Unknown output format: {fmt}")
+
+def _json_value(value):
+    if value is None or (isinstance(value, float) and math.isnan(value)):
+        return None
+    if hasattr(value, "item"):  # NumPy scalars
+        return value.item()
+    if isinstance(value, pd.Timestamp):
+        return value.isoformat()
+    return value
+
+def _file_name(name):
+    return name.lower().replace(" ", "_").replace("/", "_")